@@ -0,0 +1,317 @@
+"""Offline benchmark of the КСК coordinator refresh and sensor rendering.
+
+Runs the integration against the local fake API (fake_api.py) for a range
+of account counts and reports for every refresh scenario:
+
+- refresh latency (wall time of the coordinator refresh),
+- HTTP requests per refresh as seen by the fake API,
+- peak RSS of the process (ru_maxrss, grows monotonically between runs),
+- event loop blocking: the longest and the total lag of a 10 ms ticker,
+- p95 time of deriving one account view in the executor.
+
+Scenarios for every account count:
+
+- cold: first refresh of a new coordinator, all accounts are fetched;
+- cached: refresh of the account list and of every account coordinator
+  while the endpoint cache is fresh;
+- full: refresh of all accounts with the endpoint cache dropped;
+- entities: creation of all sensors of the entry, default and lean profile;
+- render: native value and attributes of every sensor of every account.
+
+Requires Home Assistant test helpers:
+
+    pip install pytest-homeassistant-custom-component
+
+Usage (from the repository root):
+
+    python benchmarks/bench_refresh.py --accounts 1 10 100 1000 \
+        --latency 0.02 --output bench_output.txt
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Awaitable, Callable
+from contextlib import ExitStack
+from dataclasses import dataclass
+import logging
+from pathlib import Path
+import resource
+import sys
+import time
+from typing import Any
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.helpers.json import json_bytes  # noqa: E402
+from pytest_homeassistant_custom_component.common import (  # noqa: E402
+    MockConfigEntry,
+    async_test_home_assistant,
+)
+
+from custom_components.ksk import auth, coordinator as ksk_coordinator, sensor  # noqa: E402
+from custom_components.ksk.const import DOMAIN  # noqa: E402
+from custom_components.ksk.coordinator import KSKDataUpdateCoordinator  # noqa: E402
+
+from fake_api import FakeApiConfig, FakeKskApi, account_number  # noqa: E402
+
+@dataclass
+class Result:
+    """Measurements of one scenario."""
+
+    accounts: int
+    scenario: str
+    seconds: float
+    requests: int
+    peak_rss_mb: float
+    loop_max_lag_ms: float
+    loop_total_lag_ms: float
+    extra: str = ""
+
+
+class LoopLagMonitor:
+    """Measures how long the event loop is blocked.
+
+    A ticker sleeps for a fixed interval; any delay beyond the interval is
+    time the loop spent running other callbacks without yielding.
+    """
+
+    def __init__(self, interval: float = 0.01) -> None:
+        """Initialize the monitor."""
+        self.interval = interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - started - self.interval
+            if lag > 0:
+                self.max_lag = max(self.max_lag, lag)
+                self.total_lag += lag
+
+    async def __aenter__(self) -> LoopLagMonitor:
+        self._task = asyncio.create_task(self._run())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process, MiB (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure(
+    accounts: int,
+    scenario: str,
+    api: FakeKskApi,
+    action: Callable[[], Awaitable[Any]],
+) -> Result:
+    """Run one scenario and collect its measurements."""
+    api.stats.reset()
+    async with LoopLagMonitor() as monitor:
+        started = time.perf_counter()
+        extra = await action()
+        seconds = time.perf_counter() - started
+    return Result(
+        accounts=accounts,
+        scenario=scenario,
+        seconds=seconds,
+        requests=api.stats.total,
+        peak_rss_mb=peak_rss_mb(),
+        loop_max_lag_ms=monitor.max_lag * 1000,
+        loop_total_lag_ms=monitor.total_lag * 1000,
+        extra=extra or "",
+    )
+
+
+def render(entities: list[sensor.SensorEntity]) -> str:
+    """Compute state and attributes of every sensor like a state write does."""
+    size = 0
+    for entity in entities:
+        if not entity.available:
+            continue
+        entity.native_value  # noqa: B018
+        attributes = entity.extra_state_attributes or {}
+        size += len(json_bytes(attributes))
+    return f"{len(entities)} sensors, {size / 1024:.0f} KiB attributes"
+
+
+async def bench_accounts(
+    hass: HomeAssistant, config: FakeApiConfig, accounts: int
+) -> list[Result]:
+    """Run all scenarios for one account count."""
+    config.accounts = accounts
+    api = FakeKskApi(config)
+    api.start()
+    results = []
+    try:
+        with ExitStack() as stack:
+            for module in (auth, ksk_coordinator):
+                stack.enter_context(patch.object(module, "API_BASE_URL", api.base_url))
+
+            entry = MockConfigEntry(
+                domain=DOMAIN,
+                data={CONF_USERNAME: account_number(0), CONF_PASSWORD: "password"},
+                options={},
+            )
+            entry.add_to_hass(hass)
+            coordinator = KSKDataUpdateCoordinator(hass, entry)
+            # Recorder is not set up, long-term statistics are not measured
+            coordinator.async_schedule_statistics_import = lambda *args: None
+
+            def summary() -> str:
+                stats = coordinator.last_refresh_stats
+                failed = sum(
+                    not child.last_update_success
+                    for child in coordinator.accounts.values()
+                )
+                derive = coordinator.derive_metrics.as_dict()
+                return (
+                    f"ok={coordinator.last_update_success}, failed accounts={failed}, "
+                    f"cache hits={stats.cache_hits}, "
+                    f"derive p95={derive['duration_p95_ms']} ms"
+                )
+
+            async def refresh() -> str:
+                await coordinator.async_refresh()
+                return summary()
+
+            async def refresh_cached() -> str:
+                await coordinator.async_refresh()
+                await asyncio.gather(
+                    *(child.async_refresh() for child in coordinator.accounts.values())
+                )
+                return summary()
+
+            async def refresh_full() -> str:
+                await coordinator.async_refresh_all()
+                return summary()
+
+            results.append(await measure(accounts, "cold", api, refresh))
+            results.append(await measure(accounts, "cached", api, refresh_cached))
+            results.append(await measure(accounts, "full", api, refresh_full))
+
+            async def create_all() -> str:
+                notes = []
+                for lean in (False, True):
+                    coordinator.lean_entities = lean
+                    started = time.perf_counter()
+                    created = sensor.create_entities(coordinator)
+                    elapsed = time.perf_counter() - started
+                    enabled = sum(
+                        entity.entity_registry_enabled_default for entity in created
+                    )
+                    notes.append(
+                        f"{'lean' if lean else 'default'}: {len(created)} sensors, "
+                        f"{enabled} enabled, {elapsed * 1000:.1f} ms"
+                    )
+                coordinator.lean_entities = False
+                return "; ".join(notes)
+
+            results.append(await measure(accounts, "entities", api, create_all))
+
+            entities = sensor.create_entities(coordinator)
+            for entity in entities:
+                entity.hass = hass
+
+            async def render_all() -> str:
+                return render(entities)
+
+            results.append(await measure(accounts, "render", api, render_all))
+
+            await coordinator.async_close()
+            await hass.config_entries.async_remove(entry.entry_id)
+    finally:
+        api.stop()
+    return results
+
+
+def format_results(results: list[Result]) -> str:
+    """Results as a text table."""
+    header = (
+        f"{'accounts':>8} {'scenario':<8} {'seconds':>9} {'requests':>9} "
+        f"{'peak MiB':>9} {'max lag ms':>11} {'total lag ms':>13}  notes"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        lines.append(
+            f"{result.accounts:>8} {result.scenario:<8} {result.seconds:>9.3f} "
+            f"{result.requests:>9} {result.peak_rss_mb:>9.1f} "
+            f"{result.loop_max_lag_ms:>11.1f} {result.loop_total_lag_ms:>13.1f}  "
+            f"{result.extra}"
+        )
+    return "\n".join(lines)
+
+
+async def async_main(args: argparse.Namespace) -> str:
+    """Run the benchmark."""
+    config = FakeApiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        unauthorized_rate=args.unauthorized_rate,
+        history_size=args.history_size,
+        zones=args.zones,
+        seed=args.seed,
+    )
+    results = []
+    async with async_test_home_assistant() as hass:
+        for accounts in args.accounts:
+            results.extend(await bench_accounts(hass, config, accounts))
+        await hass.async_stop(force=True)
+    return format_results(results)
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="seconds")
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="share of data requests answered with 500 (retries wait API_RETRY_DELAY)",
+    )
+    parser.add_argument(
+        "--unauthorized-rate",
+        type=float,
+        default=0.0,
+        help="share of data requests answered with 401",
+    )
+    parser.add_argument(
+        "--history-size",
+        type=int,
+        default=24,
+        help="meter and payment history entries per account (payload size)",
+    )
+    parser.add_argument("--zones", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the table to a file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR)
+    table = asyncio.run(async_main(args))
+    print(table)
+    if args.output:
+        args.output.write_text(table + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,12 @@ import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
+from homeassistant.helpers.storage import Store
 
-from .const import DOMAIN
+from .const import DOMAIN, SNAPSHOT_STORAGE_KEY, SNAPSHOT_STORAGE_VERSION
 from .coordinator import KSKDataUpdateCoordinator
+from .services import async_setup_services, async_unload_services
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -23,19 +25,38 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # Создаем координатор данных
     coordinator = KSKDataUpdateCoordinator(hass, entry)
     
-    # Выполняем первоначальное обновление данных
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except Exception as err:
-        _LOGGER.error("Ошибка при первоначальной настройке КСК: %s", err)
-        raise ConfigEntryNotReady(f"Не удалось подключиться к КСК: {err}") from err
+    # Если есть снимок последних данных, сенсоры создаются сразу из него,
+    # а свежие данные всех счетов загружаются в фоне после настройки платформ.
+    # Иначе выполняем первоначальное обновление данных.
+    restored = await coordinator.async_restore_snapshot()
+    if not restored:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except ConfigEntryAuthFailed:
+            # Неверные данные авторизации: Home Assistant запустит повторную
+            # авторизацию вместо бесконечных повторов настройки
+            await coordinator.async_close()
+            raise
+        except Exception as err:
+            _LOGGER.error("Ошибка при первоначальной настройке КСК: %s", err)
+            await coordinator.async_close()
+            raise ConfigEntryNotReady(f"Не удалось подключиться к КСК: {err}") from err
     
     # Сохраняем координатор в hass.data
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
     
-    # Настраиваем платформы
+    # Настраиваем платформы и службы
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    await async_setup_services(hass)
+    
+    if restored:
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"{DOMAIN}_{entry.entry_id}_refresh"
+        )
+    
+    # Перезагружаем интеграцию при изменении настроек
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     
     _LOGGER.info("Интеграция КСК успешно настроена")
     return True
@@ -49,9 +70,30 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     
     if unload_ok:
-        # Удаляем данные из hass.data
-        hass.data[DOMAIN].pop(entry.entry_id)
+        # Удаляем данные из hass.data и закрываем HTTP сессию
+        coordinator: KSKDataUpdateCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_close()
         if not hass.data[DOMAIN]:
             hass.data.pop(DOMAIN)
+            await async_unload_services(hass)
     
-    return unload_ok 
\ No newline at end of file
+    return unload_ok
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Перезагрузка интеграции КСК при изменении настроек."""
+    coordinator: KSKDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    # Данные записи обновляются и самой интеграцией (например, запомненный
+    # вариант авторизации), перезагрузка нужна только при смене настроек
+    if entry.options == coordinator.entry_options:
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Удаление снимка данных при удалении интеграции КСК."""
+    await Store(
+        hass,
+        SNAPSHOT_STORAGE_VERSION,
+        SNAPSHOT_STORAGE_KEY.format(entry_id=entry.entry_id),
+    ).async_remove()
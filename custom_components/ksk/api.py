@@ -0,0 +1,262 @@
+"""Общий клиент API КСК для записей интеграции с одним логином."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Mapping
+from dataclasses import dataclass
+from datetime import timedelta
+import logging
+import time
+from types import MappingProxyType
+from typing import Any
+
+from http.cookies import Morsel
+
+from aiohttp import hdrs
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import (
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    EVENT_HOMEASSISTANT_CLOSE,
+)
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+
+from .auth import AuthVariant, KSKTokenManager, async_probe_auth
+from .const import (
+    AUTH_PROBE_MAX_AGE,
+    AUTH_PROBE_TIMEOUT,
+    CONF_AUTH_VARIANT,
+    CONF_DISTRICT,
+    DATA_API_CLIENTS,
+    DATA_AUTH_PROBES,
+    MAIN_SITE_URL,
+)
+from .helpers import create_api_session
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class EndpointCacheEntry:
+    """Закешированный ответ endpoint'а API."""
+
+    payload: Any
+    fetched: float
+    digest: str | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def is_fresh(self, ttl: timedelta | None) -> bool:
+        """Проверка, что ответ не устарел и запрос можно не выполнять."""
+        return ttl is not None and time.monotonic() - self.fetched < ttl.total_seconds()
+
+
+@dataclass(frozen=True)
+class AuthProbeResult:
+    """Результат успешной проверки данных авторизации."""
+
+    password: str
+    token: str
+    variant: AuthVariant
+    cookies: tuple[Morsel, ...]
+    obtained: float
+
+    def is_valid_for(self, password: str) -> bool:
+        """Результат получен с этим паролем и еще не устарел."""
+        return (
+            self.password == password
+            and time.monotonic() - self.obtained < AUTH_PROBE_MAX_AGE.total_seconds()
+        )
+
+
+async def async_validate_credentials(
+    hass: HomeAssistant, username: str, password: str
+) -> AuthProbeResult:
+    """Проверка данных авторизации с запоминанием результата.
+
+    Токен, cookies и сработавший вариант авторизации запоминаются, и
+    клиент новой записи использует их без повторной авторизации.
+    """
+    probes: dict[str, AuthProbeResult] = hass.data.setdefault(DATA_AUTH_PROBES, {})
+    if (probe := probes.get(username)) is not None and probe.is_valid_for(password):
+        return probe
+
+    session = create_api_session()
+    try:
+        token, variant = await async_probe_auth(
+            session, username, password, AUTH_PROBE_TIMEOUT.total_seconds()
+        )
+        cookies = tuple(session.cookie_jar)
+    finally:
+        await session.close()
+
+    probe = probes[username] = AuthProbeResult(
+        password, token, variant, cookies, time.monotonic()
+    )
+    _LOGGER.debug("Данные авторизации КСК проверены, вариант %s", variant.key)
+    return probe
+
+
+class KSKApiClient:
+    """Авторизованный клиент API КСК, общий для записей с одним логином.
+
+    Записи интеграции с одинаковым логином используют одну HTTP сессию,
+    один токен и один кеш ответов API, а одновременные запросы одного
+    адреса выполняются один раз. Клиент закрывается, когда выгружена
+    последняя использующая его запись.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, username: str, password: str, variant: str | None
+    ) -> None:
+        """Инициализация клиента."""
+        self.hass = hass
+        self.username = username
+        self.session = create_api_session()
+        self.token_manager = KSKTokenManager(
+            self.session,
+            username,
+            password,
+            variant=variant,
+            variant_callback=self._async_save_auth_variant,
+        )
+        # Записи интеграции, использующие клиент
+        self.entry_ids: set[str] = set()
+        self.endpoint_cache: dict[str, EndpointCacheEntry] = {}
+        self._pending_requests: dict[str, asyncio.Future[Any]] = {}
+        self._auth_headers: Mapping[str, str] | None = None
+        self._auth_headers_token: str | None = None
+        # Сессия закрывается и при остановке Home Assistant без выгрузки записей
+        self._unsub_close: CALLBACK_TYPE | None = hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_CLOSE, self._async_close_on_shutdown
+        )
+
+    async def _async_close_on_shutdown(self, event: Event) -> None:
+        """Закрытие сессии при остановке Home Assistant."""
+        self._unsub_close = None
+        self.token_manager.cancel()
+        await self.session.close()
+
+    async def async_close(self) -> None:
+        """Закрытие HTTP сессии клиента."""
+        if self._unsub_close is not None:
+            self._unsub_close()
+            self._unsub_close = None
+        self.token_manager.cancel()
+        await self.session.close()
+
+    @property
+    def auth_token(self) -> str | None:
+        """Текущий токен авторизации."""
+        return self.token_manager.token
+
+    def get_auth_headers(self) -> Mapping[str, str]:
+        """Получение заголовков авторизации.
+
+        Общие заголовки задает сессия, здесь только зависящие от токена.
+        Заголовки пересобираются только при смене токена.
+        """
+        token = self.auth_token
+        if self._auth_headers is None or token != self._auth_headers_token:
+            headers = {hdrs.REFERER: f"{MAIN_SITE_URL}/{self.username}"}
+            if token:
+                headers[hdrs.AUTHORIZATION] = f"Bearer {token}"
+            self._auth_headers = MappingProxyType(headers)
+            self._auth_headers_token = token
+        return self._auth_headers
+
+    async def async_shared_request(
+        self, url: str, request: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """Выполнение запроса, общего для одновременных вызовов с одним адресом.
+
+        Если запрос адреса уже выполняется, ожидается его результат.
+        Возвращает ответ и признак того, что он получен другим вызовом.
+        """
+        while (pending := self._pending_requests.get(url)) is not None:
+            try:
+                return await asyncio.shield(pending), True
+            except asyncio.CancelledError:
+                # Отменен выполнявший запрос вызов - выполняем запрос сами
+                if not pending.cancelled():
+                    raise
+
+        future: asyncio.Future[Any] = self.hass.loop.create_future()
+        self._pending_requests[url] = future
+        try:
+            payload = await request()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            # Исключение получат ожидающие вызовы, если они есть
+            future.exception()
+            raise
+        else:
+            future.set_result(payload)
+            return payload, False
+        finally:
+            self._pending_requests.pop(url, None)
+
+    @callback
+    def _async_save_auth_variant(self, variant: AuthVariant) -> None:
+        """Запоминание сработавшего варианта авторизации во всех записях клиента."""
+        _LOGGER.debug("Запомнен вариант авторизации КСК: %s", variant.key)
+        for entry_id in self.entry_ids:
+            if (entry := self.hass.config_entries.async_get_entry(entry_id)) is None:
+                continue
+            self.hass.config_entries.async_update_entry(
+                entry,
+                data={
+                    **entry.data,
+                    CONF_AUTH_VARIANT: variant.key,
+                    CONF_DISTRICT: variant.district,
+                },
+            )
+
+
+@callback
+def async_get_api_client(hass: HomeAssistant, entry: ConfigEntry) -> KSKApiClient:
+    """Клиент API для записи интеграции, общий для записей с одним логином."""
+    clients: dict[str, KSKApiClient] = hass.data.setdefault(DATA_API_CLIENTS, {})
+    username = entry.data[CONF_USERNAME]
+    password = entry.data[CONF_PASSWORD]
+    if (client := clients.get(username)) is None:
+        client = clients[username] = KSKApiClient(
+            hass, username, password, entry.data.get(CONF_AUTH_VARIANT)
+        )
+    elif client.token_manager.password != password:
+        # Пароль записи изменен: токен получен со старым паролем
+        _LOGGER.debug("Пароль КСК для %s изменен, повторная авторизация", username)
+        client.token_manager.password = password
+        client.token_manager.invalidate()
+    client.entry_ids.add(entry.entry_id)
+
+    # Токен, полученный при проверке данных в мастере настройки
+    probe = hass.data.get(DATA_AUTH_PROBES, {}).pop(username, None)
+    if (
+        probe is not None
+        and probe.is_valid_for(password)
+        and not client.token_manager.token_valid
+    ):
+        client.session.cookie_jar.update_cookies(
+            {morsel.key: morsel for morsel in probe.cookies}
+        )
+        client.token_manager.set_token(probe.token, probe.variant)
+    return client
+
+
+async def async_release_api_client(
+    hass: HomeAssistant, client: KSKApiClient, entry_id: str
+) -> None:
+    """Освобождение клиента записью; последняя запись закрывает сессию."""
+    client.entry_ids.discard(entry_id)
+    if client.entry_ids:
+        return
+    clients: dict[str, KSKApiClient] = hass.data.get(DATA_API_CLIENTS, {})
+    if clients.get(client.username) is client:
+        del clients[client.username]
+    if not clients:
+        hass.data.pop(DATA_API_CLIENTS, None)
+    await client.async_close()
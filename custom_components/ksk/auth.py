@@ -0,0 +1,307 @@
+"""Управление токеном авторизации КСК."""
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Final
+
+import aiohttp
+
+from .const import (
+    API_AUTH_URL,
+    API_BASE_URL,
+    AUTH_TIMEOUT,
+    MAIN_SITE_URL,
+    TOKEN_REFRESH_MARGIN,
+)
+from .exceptions import CannotConnect, InvalidAuth
+from .metrics import current_trace
+
+_LOGGER = logging.getLogger(__name__)
+
+# Дополнительные заголовки запроса авторизации, общие заголовки задает сессия
+AUTH_HEADERS: Final = MappingProxyType({"Referer": f"{MAIN_SITE_URL}/"})
+
+
+@dataclass(frozen=True)
+class AuthVariant:
+    """Вариант формата данных авторизации."""
+
+    key: str
+    district: int | None = None
+    prefixed: bool = False
+    district_field: str | None = None
+
+    def payload(self, username: str, password: str) -> dict[str, Any]:
+        """Данные запроса авторизации для этого варианта."""
+        account = username
+        if self.prefixed:
+            # Номер счета с префиксом района (найдено в JS коде)
+            account = str(self.district * int(1e8) + int(username))
+        data: dict[str, Any] = {"account": account, "password": password}
+        if self.district_field:
+            data[self.district_field] = self.district
+        return data
+
+
+# Варианты в порядке перебора
+AUTH_VARIANTS: tuple[AuthVariant, ...] = (
+    # Базовый формат
+    AuthVariant("plain"),
+    # С district (найдено в анализе API)
+    AuthVariant("district_5", district=5, district_field="district"),
+    AuthVariant("id_5", district=5, district_field="id"),
+    # Формат с умножением на district
+    AuthVariant("prefixed_5", district=5, prefixed=True),
+    AuthVariant("prefixed_district_5", district=5, prefixed=True, district_field="district"),
+    # Другие районы
+    AuthVariant("prefixed_district_6", district=6, prefixed=True, district_field="district"),
+    AuthVariant("prefixed_district_7", district=7, prefixed=True, district_field="district"),
+    AuthVariant("prefixed_district_8", district=8, prefixed=True, district_field="district"),
+)
+
+
+def get_auth_variants(username: str, preferred: str | None = None) -> list[AuthVariant]:
+    """Варианты авторизации для логина, запомненный вариант идет первым."""
+    variants = [
+        variant
+        for variant in AUTH_VARIANTS
+        if not variant.prefixed or username.isdigit()
+    ]
+    variants.sort(key=lambda variant: variant.key != preferred)
+    return variants
+
+
+def get_token_expiry(token: str) -> float | None:
+    """Время истечения токена (unix time) из поля exp JWT, если оно есть."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+async def async_sign_in(
+    session: aiohttp.ClientSession,
+    username: str,
+    password: str,
+    variant: AuthVariant,
+) -> str:
+    """Одна попытка авторизации, возвращает токен.
+
+    InvalidAuth - вариант отклонен сервером, CannotConnect - ошибка
+    соединения или неожиданный ответ.
+    """
+    try:
+        async with session.post(
+            f"{API_BASE_URL}{API_AUTH_URL}",
+            json=variant.payload(username, password),
+            headers=AUTH_HEADERS,
+            timeout=30,
+        ) as response:
+            if response.status == 200:
+                response_data = await response.json()
+                token = response_data.get("token")
+                if not token and isinstance(response_data.get("data"), dict):
+                    # Возможно успешная авторизация с токеном во вложенных данных
+                    token = response_data["data"].get("token")
+                if not token:
+                    raise InvalidAuth("В ответе авторизации нет токена")
+                return token
+
+            if response.status in (400, 404):
+                error_data = await response.json()
+                error_msg = error_data.get("message", "Unknown error")
+                if "not registered" in error_msg:
+                    raise InvalidAuth("Лицевой счет не зарегистрирован в системе")
+                if "inconsistent" in error_msg:
+                    raise InvalidAuth("Неверная пара логин/пароль")
+                raise InvalidAuth(f"Ошибка авторизации: {error_msg}")
+
+            raise CannotConnect(f"Неожиданный статус ответа: {response.status}")
+    except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+        raise CannotConnect(f"Ошибка запроса авторизации: {err}") from err
+
+
+async def async_probe_auth(
+    session: aiohttp.ClientSession,
+    username: str,
+    password: str,
+    timeout: float,
+) -> tuple[str, AuthVariant]:
+    """Быстрая проверка данных авторизации.
+
+    Все варианты авторизации пробуются одновременно, первый успешный
+    побеждает, остальные попытки отменяются. Общее время проверки
+    ограничено timeout секунд.
+    """
+    tasks = {
+        asyncio.create_task(async_sign_in(session, username, password, variant)): variant
+        for variant in get_auth_variants(username)
+    }
+    pending = set(tasks)
+    rejected: list[InvalidAuth] = []
+    try:
+        async with asyncio.timeout(timeout):
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    try:
+                        return task.result(), tasks[task]
+                    except InvalidAuth as err:
+                        rejected.append(err)
+                    except CannotConnect as err:
+                        _LOGGER.debug("Ошибка проверки авторизации %s: %s", tasks[task].key, err)
+    except TimeoutError as err:
+        raise CannotConnect("Превышено время проверки авторизации") from err
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    # Данные неверны, только если сервер отклонил все варианты
+    if len(rejected) == len(tasks):
+        raise rejected[0]
+    raise CannotConnect("Не удалось проверить данные авторизации")
+
+
+class KSKTokenManager:
+    """Получение и обновление токена авторизации КСК.
+
+    Запоминает вариант авторизации, который сработал, отслеживает срок
+    действия токена и гарантирует, что одновременно выполняется только
+    одна авторизация. Авторизация выполняется в отдельной задаче со своим
+    ограничением времени: отмена ожидающего запроса ее не прерывает.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        username: str,
+        password: str,
+        variant: str | None = None,
+        variant_callback: Callable[[AuthVariant], None] | None = None,
+    ) -> None:
+        """Инициализация менеджера токена."""
+        self.session = session
+        self.username = username
+        self.password = password
+        self.variant = variant
+        self.token: str | None = None
+        self.expires_at: float | None = None
+        self.request_count = 0
+        self._variant_callback = variant_callback
+        self._auth_task: asyncio.Task[None] | None = None
+
+    @property
+    def token_valid(self) -> bool:
+        """Токен получен и не истекает в ближайшее время."""
+        if not self.token:
+            return False
+        if self.expires_at is None:
+            return True
+        return time.time() < self.expires_at - TOKEN_REFRESH_MARGIN.total_seconds()
+
+    def invalidate(self) -> None:
+        """Сброс токена и cookies."""
+        self.token = None
+        self.expires_at = None
+        self.session.cookie_jar.clear()
+
+    def cancel(self) -> None:
+        """Отмена выполняющейся авторизации."""
+        if self._auth_task is not None:
+            self._auth_task.cancel()
+
+    async def async_ensure_token(self, rejected_token: str | None = None) -> str:
+        """Получение действующего токена.
+
+        rejected_token - токен, отклоненный сервером. Если токен уже обновлен
+        другим запросом, повторная авторизация не выполняется. Одновременные
+        вызовы ожидают одну общую авторизацию.
+        """
+        if rejected_token is not None and rejected_token == self.token:
+            self.invalidate()
+        if self.token_valid:
+            return self.token
+        if self._auth_task is None:
+            self._auth_task = asyncio.create_task(self._async_authenticate_timed())
+            self._auth_task.add_done_callback(self._auth_done)
+        await asyncio.shield(self._auth_task)
+        return self.token
+
+    def _auth_done(self, task: asyncio.Task[None]) -> None:
+        """Завершение общей авторизации."""
+        self._auth_task = None
+        # Ошибка считается полученной, даже если все ожидающие отменены
+        if not task.cancelled():
+            task.exception()
+
+    async def _async_authenticate_timed(self) -> None:
+        """Авторизация с собственным ограничением времени."""
+        try:
+            async with asyncio.timeout(AUTH_TIMEOUT.total_seconds()):
+                await self._async_authenticate()
+        except TimeoutError as err:
+            raise CannotConnect("Превышено время авторизации") from err
+
+    async def _async_authenticate(self) -> None:
+        """Прямая авторизация через API без браузера.
+
+        Варианты пробуются по очереди, начиная с запомненного. Если все
+        варианты отклонены сервером, данные авторизации неверны.
+        """
+        _LOGGER.info("Запуск прямой авторизации КСК...")
+
+        auth_attempts = get_auth_variants(self.username, self.variant)
+        rejected = True
+        last_error: Exception | None = None
+        for i, variant in enumerate(auth_attempts, 1):
+            _LOGGER.debug(
+                "Попытка авторизации %d/%d (%s)", i, len(auth_attempts), variant.key
+            )
+            self.request_count += 1
+            if (trace := current_trace.get()) is not None:
+                trace.requests += 1
+            try:
+                token = await async_sign_in(
+                    self.session, self.username, self.password, variant
+                )
+            except InvalidAuth as err:
+                last_error = err
+                continue
+            except CannotConnect as err:
+                _LOGGER.warning("Ошибка в попытке авторизации %d: %s", i, err)
+                rejected = False
+                last_error = err
+                continue
+
+            # Cookies ответа сохраняются в cookie jar сессии
+            self.set_token(token, variant)
+            _LOGGER.info("Авторизация КСК успешна")
+            return
+
+        _LOGGER.error("Ошибка авторизации КСК: %s", last_error)
+        if rejected:
+            raise InvalidAuth(f"Ошибка авторизации: {last_error}")
+        raise CannotConnect(f"Ошибка авторизации: {last_error}")
+
+    def set_token(self, token: str, variant: AuthVariant) -> None:
+        """Сохранение полученного токена и сработавшего варианта."""
+        self.token = token
+        self.expires_at = get_token_expiry(token)
+
+        if variant.key != self.variant:
+            self.variant = variant.key
+            if self._variant_callback is not None:
+                self._variant_callback(variant)
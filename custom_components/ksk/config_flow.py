@@ -13,8 +13,28 @@ from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
 from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 
-from .const import DOMAIN
-from .exceptions import CannotConnect, InvalidAuth
+from .api import AuthProbeResult, async_validate_credentials
+from .const import (
+    CONF_ACCOUNTS,
+    CONF_ADAPTIVE_UPDATE,
+    CONF_API_METRICS_SENSORS,
+    CONF_AUTH_VARIANT,
+    CONF_DISTRICT,
+    CONF_LEAN_ENTITIES,
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_MAX_PARALLEL_ACCOUNTS,
+    CONF_SHARDS,
+    DEFAULT_ADAPTIVE_UPDATE,
+    DEFAULT_API_METRICS_SENSORS,
+    DEFAULT_LEAN_ENTITIES,
+    DEFAULT_COMPACT_ATTRIBUTES,
+    DEFAULT_MAX_PARALLEL_ACCOUNTS,
+    DEFAULT_SHARDS,
+    DOMAIN,
+    MAX_PARALLEL_ACCOUNTS_LIMIT,
+    MAX_SHARDS,
+)
+from .exceptions import AccountsConfigured, CannotConnect, InvalidAccounts, InvalidAuth
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,10 +42,19 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_USERNAME): str,
         vol.Required(CONF_PASSWORD): str,
+        vol.Optional(CONF_ACCOUNTS, default=""): str,
     }
 )
 
 
+def _parse_account_list(value: str) -> list[str]:
+    """Номера лицевых счетов записи через запятую или пробел."""
+    accounts = sorted(set(value.replace(",", " ").split()))
+    if not all(account.isdigit() for account in accounts):
+        raise InvalidAccounts("Номера лицевых счетов должны состоять из цифр")
+    return accounts
+
+
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for KSK."""
 
@@ -39,21 +68,41 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors: dict[str, str] = {}
 
         if user_input is not None:
+            username = user_input[CONF_USERNAME]
             try:
-                # Проверяем данные авторизации
-                await self._validate_input(user_input)
-                
-                # Создаем уникальный ID на основе username
-                unique_id = user_input[CONF_USERNAME]
+                accounts = _parse_account_list(user_input.get(CONF_ACCOUNTS, ""))
+                # Записей с одним логином может быть несколько (например,
+                # по одной на здание), каждая со своим набором счетов
+                unique_id = username
+                title = f"КСК {username}"
+                if accounts:
+                    unique_id = f"{username}:{','.join(accounts)}"
+                    title = f"КСК {username} ({', '.join(accounts)})"
                 await self.async_set_unique_id(unique_id)
                 self._abort_if_unique_id_configured()
+                self._check_accounts_configured(username, accounts)
+                
+                # Проверяем данные авторизации
+                probe = await self._validate_input(user_input)
                 
-                # Создаем запись конфигурации
+                # Создаем запись конфигурации; сработавший вариант
+                # авторизации запоминается, а полученный токен использует
+                # первое обновление
                 return self.async_create_entry(
-                    title=f"КСК {user_input[CONF_USERNAME]}",
-                    data=user_input,
+                    title=title,
+                    data={
+                        CONF_USERNAME: username,
+                        CONF_PASSWORD: user_input[CONF_PASSWORD],
+                        CONF_ACCOUNTS: accounts,
+                        CONF_AUTH_VARIANT: probe.variant.key,
+                        CONF_DISTRICT: probe.variant.district,
+                    },
                 )
                 
+            except InvalidAccounts:
+                errors[CONF_ACCOUNTS] = "invalid_accounts"
+            except AccountsConfigured:
+                errors[CONF_ACCOUNTS] = "accounts_configured"
             except CannotConnect:
                 errors["base"] = "cannot_connect"
             except InvalidAuth:
@@ -68,7 +117,22 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
-    async def _validate_input(self, data: dict[str, Any]) -> None:
+    def _check_accounts_configured(self, username: str, accounts: list[str]) -> None:
+        """Проверка, что счета не входят в другую запись с тем же логином.
+
+        Пустой список счетов означает все счета логина. Одинаковые счета в
+        двух записях дали бы одинаковые ID сенсоров и устройств.
+        """
+        for entry in self._async_current_entries(include_ignore=False):
+            if entry.data.get(CONF_USERNAME) != username:
+                continue
+            configured = entry.data.get(CONF_ACCOUNTS) or []
+            if not accounts or not configured or set(accounts) & set(configured):
+                raise AccountsConfigured(
+                    f"Счета логина {username} уже добавлены записью {entry.title}"
+                )
+
+    async def _validate_input(self, data: dict[str, Any]) -> AuthProbeResult:
         """Проверка данных авторизации."""
         username = data[CONF_USERNAME]
         password = data[CONF_PASSWORD]
@@ -80,12 +144,11 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if not username.isdigit():
             raise InvalidAuth("Логин должен быть номером лицевого счета (только цифры)")
         
-        # Для полной проверки можно было бы запустить браузерную авторизацию,
-        # но это займет много времени. Ограничимся базовой проверкой.
-        _LOGGER.info("Данные авторизации КСК прошли базовую проверку")
-        
-        # В реальной проверке здесь был бы запуск браузерной автоматизации,
-        # но мы делаем это позже в координаторе для экономии времени
+        # Все варианты авторизации пробуются одновременно с общим
+        # ограничением времени
+        probe = await async_validate_credentials(self.hass, username, password)
+        _LOGGER.info("Данные авторизации КСК проверены")
+        return probe
 
     async def async_step_reauth(self, entry_data: Mapping[str, Any]) -> FlowResult:
         """Handle reauthorization request from KSK."""
@@ -110,7 +173,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             }
 
             try:
-                await self._validate_input(data)
+                probe = await self._validate_input(data)
             except CannotConnect:
                 errors["base"] = "cannot_connect"
             except InvalidAuth:
@@ -124,6 +187,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     data={
                         **self.reauth_entry.data,
                         CONF_PASSWORD: password,
+                        CONF_AUTH_VARIANT: probe.variant.key,
+                        CONF_DISTRICT: probe.variant.district,
                     },
                 )
                 await self.hass.config_entries.async_reload(self.reauth_entry.entry_id)
@@ -157,5 +222,45 @@ class KskOptionsFlowHandler(OptionsFlowWithConfigEntry):
 
         return self.async_show_form(
             step_id="init",
-            data_schema=vol.Schema({}),
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_MAX_PARALLEL_ACCOUNTS,
+                        default=self.options.get(
+                            CONF_MAX_PARALLEL_ACCOUNTS, DEFAULT_MAX_PARALLEL_ACCOUNTS
+                        ),
+                    ): vol.All(
+                        vol.Coerce(int),
+                        vol.Range(min=1, max=MAX_PARALLEL_ACCOUNTS_LIMIT),
+                    ),
+                    vol.Optional(
+                        CONF_COMPACT_ATTRIBUTES,
+                        default=self.options.get(
+                            CONF_COMPACT_ATTRIBUTES, DEFAULT_COMPACT_ATTRIBUTES
+                        ),
+                    ): bool,
+                    vol.Optional(
+                        CONF_SHARDS,
+                        default=self.options.get(CONF_SHARDS, DEFAULT_SHARDS),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_SHARDS)),
+                    vol.Optional(
+                        CONF_ADAPTIVE_UPDATE,
+                        default=self.options.get(
+                            CONF_ADAPTIVE_UPDATE, DEFAULT_ADAPTIVE_UPDATE
+                        ),
+                    ): bool,
+                    vol.Optional(
+                        CONF_API_METRICS_SENSORS,
+                        default=self.options.get(
+                            CONF_API_METRICS_SENSORS, DEFAULT_API_METRICS_SENSORS
+                        ),
+                    ): bool,
+                    vol.Optional(
+                        CONF_LEAN_ENTITIES,
+                        default=self.options.get(
+                            CONF_LEAN_ENTITIES, DEFAULT_LEAN_ENTITIES
+                        ),
+                    ): bool,
+                }
+            ),
         ) 
\ No newline at end of file
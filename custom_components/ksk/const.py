@@ -2,11 +2,16 @@
 from __future__ import annotations
 
 from datetime import timedelta
+from types import MappingProxyType
 from typing import Final
 
 from homeassistant.const import Platform
 
 DOMAIN: Final = "ksk"
+# Общие клиенты API по логину в hass.data
+DATA_API_CLIENTS: Final = f"{DOMAIN}_api_clients"
+# Результаты проверки данных авторизации по логину в hass.data
+DATA_AUTH_PROBES: Final = f"{DOMAIN}_auth_probes"
 
 ATTRIBUTION: Final = "Данные получены от Калужской Сбытовой Компании"
 MANUFACTURER: Final = "Калужская Сбытовая Компания"
@@ -19,12 +24,54 @@ MOBILE_APP_NAME: Final = "КСК"
 API_TIMEOUT: Final = 30
 API_MAX_TRIES: Final = 3
 API_RETRY_DELAY: Final = 10
+# Время ожидания ответа по endpoint'ам, с каждой попыткой увеличивается
+API_TIMEOUTS: Final[dict[str, int]] = {
+    "user_info": 15,
+    "accounts": 20,
+    "account_details": 15,
+    "transmission_details": 15,
+    "meter_history": 45,
+    "payment_details": 15,
+    "payment_history": 45,
+}
+# Общее время на повторные попытки запросов за одно обновление
+API_RETRY_BUDGET: Final[timedelta] = timedelta(minutes=2)
+# После стольких ошибок подряд запросы к API приостанавливаются
+CIRCUIT_BREAKER_THRESHOLD: Final = 10
+CIRCUIT_BREAKER_RECOVERY: Final[timedelta] = timedelta(minutes=5)
 UPDATE_HOUR_BEGIN: Final = 1
 UPDATE_HOUR_END: Final = 5
 UPDATE_INTERVAL: Final[timedelta] = timedelta(minutes=30)
+# Максимальный интервал повторных попыток обновления счета после ошибок
+ACCOUNT_MAX_BACKOFF: Final[timedelta] = timedelta(hours=6)
+# Задержка между группами счетов при полном обновлении
+SHARD_REFRESH_DELAY: Final[timedelta] = timedelta(minutes=1)
+# Дни месяца, в которые принимаются показания
+READINGS_WINDOW_START_DAY: Final = 15
+READINGS_WINDOW_END_DAY: Final = 26
+# Токен обновляется заранее, за это время до истечения срока действия
+TOKEN_REFRESH_MARGIN: Final[timedelta] = timedelta(minutes=5)
+# Общее время повторной авторизации, не зависит от времени запросов API
+AUTH_TIMEOUT: Final[timedelta] = timedelta(seconds=90)
+# Общее время проверки данных авторизации при настройке
+AUTH_PROBE_TIMEOUT: Final[timedelta] = timedelta(seconds=15)
+# Время, в течение которого токен проверки используется новой записью
+AUTH_PROBE_MAX_AGE: Final[timedelta] = timedelta(minutes=10)
 
 REQUEST_REFRESH_DEFAULT_COOLDOWN = 5
 
+# Снимок последних полученных данных для быстрого старта
+SNAPSHOT_STORAGE_VERSION: Final = 1
+SNAPSHOT_STORAGE_KEY: Final = f"{DOMAIN}.{{entry_id}}.snapshot"
+SNAPSHOT_SAVE_DELAY: Final = 10
+SNAPSHOT_MAX_AGE: Final[timedelta] = timedelta(days=7)
+
+# В окне истории в памяти всегда есть столько самых новых записей
+HISTORY_MIN_ENTRIES: Final = 5
+# Записей истории на странице службы get_history
+HISTORY_PAGE_SIZE: Final = 50
+HISTORY_MAX_PAGE_SIZE: Final = 500
+
 PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.BUTTON]
 
 CONF_ACCOUNT: Final = "account"
@@ -36,12 +83,38 @@ CONF_INFO: Final = "info"
 CONF_PAYMENT: Final = "payment"
 CONF_READINGS: Final = "readings"
 CONF_AUTO_UPDATE: Final = "auto_update"
+CONF_MAX_PARALLEL_ACCOUNTS: Final = "max_parallel_accounts"
+CONF_AUTH_VARIANT: Final = "auth_variant"
+CONF_DISTRICT: Final = "district"
+CONF_COMPACT_ATTRIBUTES: Final = "compact_attributes"
+CONF_ADAPTIVE_UPDATE: Final = "adaptive_update"
+CONF_SHARDS: Final = "shards"
+CONF_API_METRICS_SENSORS: Final = "api_metrics_sensors"
+CONF_LEAN_ENTITIES: Final = "lean_entities"
 
 # РЕАЛЬНЫЕ API URLs - ОБНОВЛЕНО ПО РЕЗУЛЬТАТАМ ТЕСТИРОВАНИЯ
 API_BASE_URL: Final = "https://svet.kaluga.ru/test7/service"
 MAIN_SITE_URL: Final = "https://svet.kaluga.ru"
 CONFIGURATION_URL: Final = "https://svet.kaluga.ru/auth"
 
+# Заголовки, общие для всех запросов к API
+API_HEADERS: Final = MappingProxyType(
+    {
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "application/json, text/plain, */*",
+        "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+        "Origin": MAIN_SITE_URL,
+    }
+)
+
+# Пул соединений собственной HTTP сессии интеграции
+API_CONNECTIONS_PER_HOST: Final = 20
+API_DNS_CACHE_TTL: Final = 300
+API_KEEPALIVE_TIMEOUT: Final = 60
+
+# Ответы больше этого размера (байт) разбираются вне event loop
+JSON_EXECUTOR_THRESHOLD: Final = 256 * 1024
+
 # API Endpoints
 API_AUTH_URL: Final = "/auth/sign-in"
 API_USER_INFO_URL: Final = "/api/profile/user-info"
@@ -52,6 +125,29 @@ API_METER_HISTORY_URL: Final = "/history/meters/{account_id}"
 API_PAYMENT_DETAILS_URL: Final = "/api/pay/paymentDetails/{account_id}"
 API_PAYMENT_HISTORY_URL: Final = "/history/payments/{account_id}"
 API_TIME_URL: Final = "/service/api/service/time"
+API_SEND_READINGS_URL: Final = "/api/profile/send-meter-lk"
+
+# Пакетная отправка показаний: число одновременных запросов и статусы отчета
+READINGS_MAX_PARALLEL: Final = 5
+READINGS_SENT: Final = "sent"
+READINGS_SKIPPED: Final = "skipped"
+READINGS_REJECTED: Final = "rejected"
+READINGS_FAILED: Final = "failed"
+READINGS_UNKNOWN_ACCOUNT: Final = "unknown_account"
+
+# Время жизни закешированных ответов по endpoint'ам. Пока ответ свежий,
+# запрос не выполняется; после истечения срока запрос выполняется условно
+# (ETag/Last-Modified), а неизменившийся ответ переиспользуется.
+# None - запрашивать при каждом обновлении.
+ENDPOINT_TTLS: Final[dict[str, timedelta | None]] = {
+    "user_info": timedelta(hours=24),
+    "accounts": None,
+    "account_details": timedelta(hours=6),
+    "transmission_details": timedelta(hours=1),
+    "meter_history": timedelta(hours=24),
+    "payment_details": timedelta(hours=24),
+    "payment_history": timedelta(hours=1),
+}
 
 FORMAT_DATE_SHORT_YEAR: Final = "%d.%m.%y"
 FORMAT_DATE_FULL_YEAR: Final = "%d.%m.%Y"
@@ -70,7 +166,16 @@ ATTR_READINGS: Final = "readings"
 ATTR_BALANCE: Final = "balance"
 SERVICE_REFRESH: Final = "refresh"
 SERVICE_SEND_READINGS = "send_readings"
-SERVICE_GET_BILL: Final = "get_bill"
+SERVICE_SEND_READINGS_BATCH: Final = "send_readings_batch"
+SERVICE_GET_HISTORY: Final = "get_history"
+ATTR_HISTORY: Final = "history"
+ATTR_PAGE: Final = "page"
+ATTR_PAGE_SIZE: Final = "page_size"
+ATTR_ENTRIES: Final = "entries"
+ATTR_HAS_MORE: Final = "has_more"
+# Виды истории, загружаемой службой get_history
+HISTORY_READINGS: Final = "readings"
+HISTORY_PAYMENTS: Final = "payments"
 ACTION_TYPE_SEND_READINGS: Final = "send_readings"
 ACTION_TYPE_BILL: Final = "get_bill"
 ACTION_TYPE_REFRESH: Final = "refresh"
@@ -96,6 +201,20 @@ CONF_PHONE_NUMBER: Final = "phone_number"
 # Defaults
 DEFAULT_NAME: Final = "КСК"
 DEFAULT_AUTO_UPDATE: Final = True
+DEFAULT_MAX_PARALLEL_ACCOUNTS: Final = 10
+MAX_PARALLEL_ACCOUNTS_LIMIT: Final = 50
+DEFAULT_COMPACT_ATTRIBUTES: Final = False
+DEFAULT_ADAPTIVE_UPDATE: Final = False
+DEFAULT_SHARDS: Final = 1
+DEFAULT_API_METRICS_SENSORS: Final = False
+DEFAULT_LEAN_ENTITIES: Final = False
+MAX_SHARDS: Final = 12
+
+# Число последних запросов, по которым считаются перцентили задержки
+METRICS_LATENCY_SAMPLES: Final = 500
+
+# Максимальный размер дополнительных атрибутов сенсора в JSON, байт
+ATTRIBUTES_SIZE_BUDGET: Final = 2048
 
 # API
 API_LOGIN_URL: Final = f"{API_BASE_URL}/auth"
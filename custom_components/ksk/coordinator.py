@@ -2,25 +2,30 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import hashlib
 import logging
 import time
-from datetime import date, datetime
+import zlib
+from collections.abc import AsyncIterator, Callable, Mapping
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import Any
 
 import aiohttp
+from aiohttp import hdrs
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.util import dt as dt_util
 
 from .const import (
+    ACCOUNT_MAX_BACKOFF,
     API_BASE_URL,
-    API_AUTH_URL,
     API_USER_INFO_URL,
     API_ACCOUNTS_URL,
     API_ACCOUNT_DETAILS_URL,
@@ -28,24 +33,148 @@ from .const import (
     API_METER_HISTORY_URL,
     API_PAYMENT_DETAILS_URL,
     API_PAYMENT_HISTORY_URL,
+    API_SEND_READINGS_URL,
+    API_RETRY_BUDGET,
+    API_TIMEOUT,
+    CIRCUIT_BREAKER_RECOVERY,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CONF_ACCOUNTS,
+    CONF_ADAPTIVE_UPDATE,
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_DISTRICT,
+    CONF_MAX_PARALLEL_ACCOUNTS,
+    CONF_LEAN_ENTITIES,
+    CONF_SHARDS,
+    DEFAULT_ADAPTIVE_UPDATE,
+    DEFAULT_COMPACT_ATTRIBUTES,
+    DEFAULT_LEAN_ENTITIES,
+    DEFAULT_MAX_PARALLEL_ACCOUNTS,
+    DEFAULT_SHARDS,
     DOMAIN,
+    ENDPOINT_TTLS,
+    HISTORY_READINGS,
+    READINGS_FAILED,
+    READINGS_MAX_PARALLEL,
+    READINGS_REJECTED,
+    READINGS_SENT,
+    READINGS_SKIPPED,
+    READINGS_UNKNOWN_ACCOUNT,
+    SHARD_REFRESH_DELAY,
+    SNAPSHOT_MAX_AGE,
+    SNAPSHOT_SAVE_DELAY,
+    SNAPSHOT_STORAGE_KEY,
+    SNAPSHOT_STORAGE_VERSION,
     UPDATE_INTERVAL,
 )
+from .api import EndpointCacheEntry, async_get_api_client, async_release_api_client
+from .decorators import async_api_request_handler
 from .exceptions import CannotConnect, InvalidAuth
+from .helpers import async_json_loads, get_adaptive_update_interval
+from .history import MeterHistory, PaymentHistory, history_window_start
+from .metrics import (
+    ApiMetrics,
+    EndpointMetrics,
+    RefreshTrace,
+    StageMetrics,
+    current_trace,
+    served_from_cache,
+)
+from .models import Account, parse_accounts
+from .resilience import ApiCounters, CircuitBreaker, retry_deadline
+from .statistics import KSKStatisticsImporter
+from .views import AccountView, PortfolioAggregator, build_account_view_timed
 
 _LOGGER = logging.getLogger(__name__)
 
+@dataclass
+class KSKRefreshStats:
+    """Статистика одного цикла обновления данных."""
+
+    started: datetime | None = None
+    duration: float = 0.0
+    requests: int = 0
+    accounts: int = 0
+    failed_accounts: int = 0
+    cache_hits: int = 0
+    reauths: int = 0
+
+
+_EMPTY_ACCOUNT_VIEW = AccountView()
+
+
+def _count_cache_hit(metrics: EndpointMetrics) -> None:
+    """Учет ответа из кеша в метриках endpoint'а и трассе обновления."""
+    metrics.cache_hits += 1
+    if (trace := current_trace.get()) is not None:
+        trace.cache_hits += 1
+
+
+def _same(old: Any, new: Any) -> bool:
+    """Сравнение данных; неизменившиеся ответы API - те же объекты."""
+    return old is new or old == new
+
+
 class KSKDataUpdateCoordinator(DataUpdateCoordinator):
-    """Координатор обновления данных КСК - Исправленная версия без браузера."""
+    """Координатор обновления данных КСК - Исправленная версия без браузера.
+
+    Отвечает за авторизацию, информацию о пользователе и список лицевых
+    счетов. Детали каждого счета обновляет собственный дочерний
+    координатор KSKAccountCoordinator.
+    """
 
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
         """Инициализация координатора."""
         self.entry = entry
         self.username = entry.data[CONF_USERNAME]
         self.password = entry.data[CONF_PASSWORD]
-        self.auth_token = None
-        self.session_cookies = {}
+        # Сессия, токен и кеш ответов общие для записей с этим логином
+        self.client = async_get_api_client(hass, entry)
         self.account_id = self.username
+        # Счета записи; записи с одним логином делят счета между собой,
+        # пустой набор - все счета логина
+        self.account_filter = frozenset(entry.data.get(CONF_ACCOUNTS) or ())
+        self.entry_options = dict(entry.options)
+        self.compact_attributes = entry.options.get(
+            CONF_COMPACT_ATTRIBUTES, DEFAULT_COMPACT_ATTRIBUTES
+        )
+        self.adaptive_update = entry.options.get(
+            CONF_ADAPTIVE_UPDATE, DEFAULT_ADAPTIVE_UPDATE
+        )
+        # Включены по умолчанию только основные сенсоры счетов
+        self.lean_entities = entry.options.get(
+            CONF_LEAN_ENTITIES, DEFAULT_LEAN_ENTITIES
+        )
+        # Счета делятся на группы, обновления групп разнесены по интервалу
+        self.shards = entry.options.get(CONF_SHARDS, DEFAULT_SHARDS)
+        self.shards_updated: dict[int, datetime] = {}
+        self._full_refresh = False
+        # Дочерние координаторы лицевых счетов
+        self.accounts: dict[str, KSKAccountCoordinator] = {}
+        # Итоги по всем счетам, обновляются приращениями
+        self.portfolio = PortfolioAggregator(entry.data.get(CONF_DISTRICT))
+        self.account_update_interval = UPDATE_INTERVAL
+        self.last_refresh_stats = KSKRefreshStats()
+        self.api_counters = ApiCounters()
+        self.api_metrics = ApiMetrics()
+        # Время вычисления данных счетов для сенсоров в executor
+        self.derive_metrics = StageMetrics()
+        self.last_refresh_trace: RefreshTrace | None = None
+        self.circuit_breaker = CircuitBreaker(
+            CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RECOVERY.total_seconds()
+        )
+        self._store: Store[dict[str, Any]] = Store(
+            hass,
+            SNAPSHOT_STORAGE_VERSION,
+            SNAPSHOT_STORAGE_KEY.format(entry_id=entry.entry_id),
+            private=True,
+            atomic_writes=True,
+        )
+        self.snapshot_restored = False
+        self._changed_sections: frozenset[str] | None = None
+        self._statistics = KSKStatisticsImporter(hass)
+        self._account_semaphore = asyncio.Semaphore(
+            entry.options.get(CONF_MAX_PARALLEL_ACCOUNTS, DEFAULT_MAX_PARALLEL_ACCOUNTS)
+        )
         
         super().__init__(
             hass,
@@ -57,7 +186,231 @@ class KSKDataUpdateCoordinator(DataUpdateCoordinator):
             ),
         )
 
-    def get_all_accounts(self) -> list[dict]:
+    async def async_restore_snapshot(self) -> bool:
+        """Восстановление последних полученных данных из снимка на диске.
+
+        Возвращает True, если данные восстановлены и сенсоры можно создавать
+        до первого обновления.
+        """
+        try:
+            stored = await self._store.async_load()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Не удалось загрузить снимок данных КСК: %s", err)
+            return False
+
+        if not stored or not stored.get("accounts"):
+            return False
+
+        last_update = dt_util.parse_datetime(stored.get("last_update") or "")
+        if last_update is None or dt_util.utcnow() - last_update > SNAPSHOT_MAX_AGE:
+            _LOGGER.debug("Снимок данных КСК устарел и не будет использован")
+            return False
+
+        accounts = parse_accounts(stored["accounts"])
+        self.data = {
+            "user_info": stored.get("user_info", {}),
+            "accounts": accounts,
+            "last_update": last_update,
+        }
+
+        # Ключи JSON всегда строки, а номер счета может быть числом
+        stored_details = stored.get("accounts_details", {})
+        restored = []
+        for account in accounts:
+            if not account.number:
+                continue
+            details = {
+                **self._empty_account_details(),
+                **(stored_details.get(str(account.number)) or {}),
+            }
+            details["payment_history"] = PaymentHistory.from_snapshot(
+                details["payment_history"]
+            )
+            child = self._add_account(account)
+            restored.append(child.async_restore(details, last_update))
+        await asyncio.gather(*restored)
+
+        self.shards_updated = dict.fromkeys(range(self.shards), last_update)
+        # Первое обновление после восстановления обновляет все счета по группам
+        self._full_refresh = True
+        self.snapshot_restored = True
+        _LOGGER.info(
+            "Данные КСК восстановлены из снимка от %s", last_update.isoformat()
+        )
+        return True
+
+    def _add_account(self, account: Account) -> KSKAccountCoordinator:
+        """Создание дочернего координатора лицевого счета."""
+        child = KSKAccountCoordinator(self.hass, self, account)
+        self.accounts[account.number] = child
+        self.portfolio.update(account)
+        return child
+
+    async def _async_sync_accounts(
+        self, accounts: list[Account], refresh_all: bool
+    ) -> tuple[int, list[str]]:
+        """Синхронизация дочерних координаторов со списком лицевых счетов.
+
+        Новые счета обновляются сразу, остальные - по собственному
+        расписанию. При refresh_all сразу обновляется первая группа счетов,
+        а следующие группы - по очереди через SHARD_REFRESH_DELAY, чтобы
+        запросы всех счетов не выполнялись одновременно. Возвращает
+        количество обновленных счетов и номера счетов, обновить которые
+        не удалось.
+        """
+        current = {account.number: account for account in accounts if account.number}
+        for account_id in self.accounts.keys() - current.keys():
+            _LOGGER.info("Лицевой счет %s больше не возвращается API", account_id)
+            await self.accounts.pop(account_id).async_shutdown()
+            self.portfolio.remove(account_id)
+
+        refresh = []
+        updates = []
+        for account_id, account in current.items():
+            if (child := self.accounts.get(account_id)) is None:
+                child = self._add_account(account)
+                if not refresh_all:
+                    refresh.append(child)
+                    continue
+            elif not _same(child.account, account):
+                self.portfolio.update(account)
+                updates.append(child.async_set_account(account))
+            if refresh_all:
+                refresh.append(child)
+
+        if refresh_all and refresh:
+            # Порядок групп считается по группам, в которых есть счета
+            shards = sorted({child.shard for child in refresh})
+            for child in refresh:
+                if (position := shards.index(child.shard)) > 0:
+                    child.async_schedule_shard_refresh(SHARD_REFRESH_DELAY * position)
+            refresh = [child for child in refresh if child.shard == shards[0]]
+
+        # Количество одновременно обрабатываемых счетов ограничено семафором
+        await asyncio.gather(*updates, *(child.async_refresh() for child in refresh))
+        return len(refresh), [
+            child.account_id for child in refresh if not child.last_update_success
+        ]
+
+    def shard_for(self, account_id: str) -> int:
+        """Номер группы обновления лицевого счета."""
+        return zlib.crc32(str(account_id).encode()) % self.shards
+
+    def find_account_id(self, identifier: str) -> str | None:
+        """Номер лицевого счета по идентификатору устройства.
+
+        Номер счета в API может быть числом, а идентификатор всегда строка.
+        """
+        for account_id in self.accounts:
+            if str(account_id) == identifier:
+                return account_id
+        return None
+
+    def get_account_updated(self, account_id: str) -> datetime | None:
+        """Время последнего обновления данных лицевого счета."""
+        if (child := self.accounts.get(account_id)) is None or not child.data:
+            return None
+        return child.data["last_update"]
+
+    def get_account_view(self, account_id: str) -> AccountView:
+        """Данные лицевого счета для сенсоров."""
+        if (child := self.accounts.get(account_id)) is None:
+            return _EMPTY_ACCOUNT_VIEW
+        return child.view
+
+    def get_account_details(self, account_id: str) -> dict[str, Any]:
+        """Детальные данные лицевого счета."""
+        if (child := self.accounts.get(account_id)) is None or not child.data:
+            return {}
+        return child.data["details"]
+
+    def _diff_sections(
+        self, previous: dict[str, Any] | None, data: dict[str, Any]
+    ) -> None:
+        """Определение изменившихся общих разделов данных."""
+        if not previous:
+            self._changed_sections = None
+            return
+
+        sections = set()
+        if not _same(previous["user_info"], data["user_info"]):
+            sections.add("user_info")
+        if not _same(previous["accounts"], data["accounts"]):
+            sections.add("accounts")
+        self._changed_sections = frozenset(sections)
+
+    @callback
+    def async_schedule_statistics_import(
+        self,
+        account_id: str,
+        meter_history: MeterHistory | None = None,
+        payment_history: PaymentHistory | None = None,
+    ) -> None:
+        """Запуск импорта изменившейся истории счета в долгосрочную статистику."""
+        self.entry.async_create_background_task(
+            self.hass,
+            self._async_import_statistics(account_id, meter_history, payment_history),
+            f"{DOMAIN}_{self.entry.entry_id}_statistics_{account_id}",
+        )
+
+    async def _async_import_statistics(
+        self,
+        account_id: str,
+        meter_history: MeterHistory | None,
+        payment_history: PaymentHistory | None,
+    ) -> None:
+        """Импорт истории показаний и платежей в долгосрочную статистику."""
+        try:
+            await self._statistics.async_import_account(
+                account_id, meter_history, payment_history
+            )
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning(
+                "Не удалось импортировать статистику счета %s: %s", account_id, err
+            )
+
+    def sections_changed(self, sections: frozenset[str] | None) -> bool:
+        """Проверка, изменились ли при последнем обновлении общие разделы.
+
+        sections=None означает, что сенсор зависит от всех данных.
+        """
+        if sections is None or self._changed_sections is None:
+            return True
+        return not self._changed_sections.isdisjoint(sections)
+
+    @callback
+    def async_save_snapshot(self) -> None:
+        """Отложенное сохранение снимка данных на диск."""
+        self._store.async_delay_save(self._snapshot_to_store, SNAPSHOT_SAVE_DELAY)
+
+    @callback
+    def _snapshot_to_store(self) -> dict[str, Any]:
+        """Подготовка снимка данных для сохранения на диск."""
+        if not self.data:
+            return {}
+
+        # История показаний не нужна сенсорам и занимает больше всего места
+        return {
+            "user_info": self.data["user_info"],
+            "accounts": [account.as_api() for account in self.data["accounts"]],
+            "accounts_details": {
+                account_id: {
+                    **{
+                        key: value
+                        for key, value in child.data["details"].items()
+                        if key not in ("meter_history", "payment_history")
+                    },
+                    "payment_history": child.data["details"][
+                        "payment_history"
+                    ].as_snapshot(),
+                }
+                for account_id, child in self.accounts.items()
+                if child.data
+            },
+            "last_update": self.data["last_update"].isoformat(),
+        }
+
+    def get_all_accounts(self) -> list[Account]:
         """Получение всех лицевых счетов."""
         if not self.data or "accounts" not in self.data:
             return []
@@ -65,265 +418,480 @@ class KSKDataUpdateCoordinator(DataUpdateCoordinator):
 
     async def _async_update_data(self) -> dict[str, Any]:
         """Получение данных от API КСК."""
+        stats = KSKRefreshStats(started=dt_util.utcnow())
+        started = time.monotonic()
+        # Общее время на повторные попытки запросов за одно обновление
+        deadline_token = retry_deadline.set(started + API_RETRY_BUDGET.total_seconds())
+
+        # Пока изменения не определены, обновляются все сенсоры
+        self._changed_sections = None
+
+        # Трасса обновления: запросы, в том числе из обновляемых здесь
+        # координаторов счетов, попадают в нее через contextvar
+        trace = RefreshTrace(DOMAIN)
+        trace_token = current_trace.set(trace)
+
         try:
-            # Проверяем, есть ли действующий токен
-            if not self.auth_token:
+            # Проверяем, есть ли действующий токен, и обновляем его заранее,
+            # если срок действия скоро истекает
+            with trace.span("auth"):
                 await self._authenticate_direct()
             
             # Получаем данные пользователя
-            user_info = await self._get_user_info()
-            accounts = await self._get_accounts()
+            user_info, accounts = await asyncio.gather(
+                self._get_user_info(), self._get_accounts()
+            )
+            if self.account_filter:
+                accounts = [
+                    account
+                    for account in accounts
+                    if str(account.number) in self.account_filter
+                ]
             
             if not accounts:
                 raise UpdateFailed("Не найдены лицевые счета")
             
-            # Получаем детальную информацию по всем лицевым счетам
-            accounts_details = {}
-            for account in accounts:
-                account_id = account.get("number")
-                if not account_id:
-                    continue
-                    
-                try:
-                    # Получаем детальную информацию по каждому счету
-                    account_details = await self._get_account_details(account_id)
-                    transmission_details = await self._get_transmission_details(account_id)
-                    
-                    # Получаем историю показаний счетчика и детали платежа
-                    meter_history = await self._get_meter_history(account_id)
-                    payment_details = await self._get_payment_details(account_id)
-                    
-                    # Получаем историю платежей
-                    payment_history = await self._get_payment_history(account_id)
-                    
-                    accounts_details[account_id] = {
-                        "account_details": account_details,
-                        "transmission_details": transmission_details,
-                        "meter_history": meter_history,
-                        "payment_details": payment_details,
-                        "payment_history": payment_history,
-                    }
-                    
-                except Exception as err:
-                    _LOGGER.warning(f"Ошибка получения данных для счета {account_id}: {err}")
-                    # Сохраняем пустые данные, чтобы не ломать интеграцию
-                    accounts_details[account_id] = {
-                        "account_details": {},
-                        "transmission_details": {},
-                        "meter_history": [],
-                        "payment_details": {},
-                        "payment_history": [],
-                    }
+            if self.adaptive_update:
+                self.account_update_interval = get_adaptive_update_interval(
+                    any(account.balance.processing > 0 for account in accounts)
+                )
             
-            return {
+            # Детали счетов обновляют дочерние координаторы: здесь сразу
+            # обновляются только новые счета, при полном обновлении - все
+            # по группам
+            refresh_all = self._full_refresh or self.data is None
+            self._full_refresh = False
+            refreshed, failed = await self._async_sync_accounts(accounts, refresh_all)
+            stats.accounts = refreshed
+            stats.failed_accounts = len(failed)
+            if failed and len(failed) == len(self.accounts):
+                raise UpdateFailed("Не удалось получить данные ни одного счета")
+            
+            self.snapshot_restored = False
+            self.async_save_snapshot()
+            
+            data = {
                 "user_info": user_info,
                 "accounts": accounts,
-                "accounts_details": accounts_details,
                 "last_update": dt_util.utcnow(),
             }
+            self._diff_sections(self.data, data)
+            # Вариант авторизации (и район) мог стать известен после
+            # создания координатора; запись при этом не перезагружается
+            if self.portfolio.set_default_district(
+                self.entry.data.get(CONF_DISTRICT),
+                (child.account for child in self.accounts.values()),
+            ):
+                self._changed_sections = None
+            if self.adaptive_update:
+                self.update_interval = self.account_update_interval
+                _LOGGER.debug("Следующее обновление КСК через %s", self.update_interval)
+            return data
             
-        except InvalidAuth:
+        except (InvalidAuth, ConfigEntryAuthFailed) as err:
             # Сбрасываем токен и пробуем заново
-            self.auth_token = None
-            self.session_cookies = {}
-            raise ConfigEntryAuthFailed("Ошибка авторизации КСК")
+            self.client.token_manager.invalidate()
+            raise ConfigEntryAuthFailed("Ошибка авторизации КСК") from err
         except Exception as err:
             _LOGGER.error("Ошибка получения данных КСК: %s", err)
+            # После ошибки повторяем попытку с обычным интервалом
+            self.update_interval = UPDATE_INTERVAL
             raise UpdateFailed(f"Ошибка получения данных: {err}")
+        finally:
+            current_trace.reset(trace_token)
+            trace.finish()
+            self.last_refresh_trace = trace
+            stats.duration = time.monotonic() - started
+            stats.requests = trace.requests
+            stats.cache_hits = trace.cache_hits
+            stats.reauths = trace.reauths
+            retry_deadline.reset(deadline_token)
+            self.last_refresh_stats = stats
+            _LOGGER.debug(
+                "Обновление КСК: %d счетов (ошибок: %d), %d запросов (из кеша: %d) за %.2f с",
+                stats.accounts,
+                stats.failed_accounts,
+                stats.requests,
+                stats.cache_hits,
+                stats.duration,
+            )
+
+    async def async_fetch_account(self, account_id: str) -> dict[str, Any]:
+        """Параллельное получение всех данных по одному лицевому счету."""
+        async with self._account_semaphore:
+            results = await asyncio.gather(
+                self._get_account_details(account_id),
+                self._get_transmission_details(account_id),
+                self._get_meter_history(account_id),
+                self._get_payment_details(account_id),
+                self._get_payment_history(account_id),
+                return_exceptions=True,
+            )
+
+        # Без деталей счета и передачи показаний данные счета неполные,
+        # остальные разделы при ошибке заменяются пустыми значениями
+        sections = self._empty_account_details()
+        for section, result in zip(sections, results):
+            if not isinstance(result, BaseException):
+                sections[section] = result
+                continue
+            if isinstance(result, ConfigEntryAuthFailed) or section in (
+                "account_details",
+                "transmission_details",
+            ):
+                raise result
+            _LOGGER.warning(
+                "Не удалось получить %s для счета %s: %s", section, account_id, result
+            )
+
+        return sections
+
+    async def async_build_view(
+        self, account: Account, details: dict[str, Any]
+    ) -> AccountView:
+        """Вычисление данных лицевого счета для сенсоров в executor.
+
+        Длительность вычисления учитывается в derive_metrics, а шаг derive
+        попадает в трассу текущего обновления.
+        """
+        trace = current_trace.get()
+        started = time.monotonic()
+        view, duration = await self.hass.async_add_executor_job(
+            build_account_view_timed,
+            account,
+            details,
+            dt_util.now(),
+            self.compact_attributes,
+        )
+        self.derive_metrics.record(duration)
+        if trace is not None:
+            trace.add("derive", started, account.number)
+        return view
+
+    @staticmethod
+    def _empty_account_details() -> dict[str, Any]:
+        """Пустые данные лицевого счета."""
+        return {
+            "account_details": {},
+            "transmission_details": {},
+            "meter_history": MeterHistory(),
+            "payment_details": {},
+            "payment_history": PaymentHistory(),
+        }
+
+    @property
+    def auth_token(self) -> str | None:
+        """Текущий токен авторизации."""
+        return self.client.auth_token
 
     async def _authenticate_direct(self) -> None:
-        """Прямая авторизация через API без браузера."""
-        try:
-            _LOGGER.info("Запуск прямой авторизации КСК...")
-            
-            session = async_get_clientsession(self.hass)
-            
-            # URL для авторизации
-            auth_url = f"{API_BASE_URL}{API_AUTH_URL}"
-            
-            # Заголовки
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-                'Origin': 'https://svet.kaluga.ru',
-                'Referer': 'https://svet.kaluga.ru/',
-                'Content-Type': 'application/json',
-            }
-            
-            # Пробуем различные форматы данных авторизации
-            auth_attempts = [
-                # Базовый формат
-                {"account": self.username, "password": self.password},
-                
-                # С district (найдено в анализе API)
-                {"account": self.username, "password": self.password, "district": 5},
-                {"account": self.username, "password": self.password, "id": 5},
-                
-                # Формат с умножением на district (найдено в JS коде)
-                {"account": str(5 * int(1e8) + int(self.username)), "password": self.password},
-                {"account": str(5 * int(1e8) + int(self.username)), "password": self.password, "district": 5},
-                
-                # Другие районы
-                {"account": str(6 * int(1e8) + int(self.username)), "password": self.password, "district": 6},
-                {"account": str(7 * int(1e8) + int(self.username)), "password": self.password, "district": 7},
-                {"account": str(8 * int(1e8) + int(self.username)), "password": self.password, "district": 8},
-            ]
+        """Получение действующего токена, при необходимости с авторизацией."""
+        await self.client.token_manager.async_ensure_token()
+
+    async def async_close(self) -> None:
+        """Остановка координаторов счетов и освобождение общего клиента API."""
+        for child in self.accounts.values():
+            await child.async_shutdown()
+        await async_release_api_client(self.hass, self.client, self.entry.entry_id)
+
+    async def _make_request(
+        self,
+        url: str,
+        method: str = "GET",
+        data: dict = None,
+        endpoint: str | None = None,
+        transform: Callable[[Any], Any] | None = None,
+    ) -> dict:
+        """Выполнение HTTP запроса к API КСК.
+
+        Для GET запросов с указанным endpoint ответ кешируется в соответствии
+        с ENDPOINT_TTLS в общем кеше клиента, а неизменившиеся данные
+        переиспользуются. Одновременные запросы одного адреса из записей
+        с одним логином выполняются один раз.
+
+        transform преобразует разобранный ответ перед кешированием и
+        вызывается только при изменении содержимого ответа; он выполняется
+        в executor вместе с разбором JSON и не должен обращаться к event loop.
+        """
+        if endpoint is None:
+            return await self._async_request(url, method, data, None, transform)
+
+        metrics = self.api_metrics.endpoint(endpoint)
+        cache_entry = self.client.endpoint_cache.get(url)
+        if cache_entry is not None and cache_entry.is_fresh(ENDPOINT_TTLS.get(endpoint)):
+            _count_cache_hit(metrics)
+            served_from_cache.set(True)
+            return cache_entry.payload
+
+        payload, shared = await self.client.async_shared_request(
+            url, lambda: self._async_request(url, method, data, endpoint, transform)
+        )
+        if shared:
+            _count_cache_hit(metrics)
+            served_from_cache.set(True)
+        return payload
+
+    async def _async_request(
+        self,
+        url: str,
+        method: str,
+        data: dict | None,
+        endpoint: str | None,
+        transform: Callable[[Any], Any] | None = None,
+    ) -> Any:
+        """HTTP запрос к API КСК с условными заголовками из кеша.
+
+        Если токен отклонен сервером, выполняется повторная авторизация
+        и запрос повторяется один раз.
+        """
+        client = self.client
+        cache_entry = client.endpoint_cache.get(url) if endpoint else None
+        metrics = self.api_metrics.endpoint(endpoint) if endpoint else None
+
+        session = client.session
+        reauthenticated = False
+        while True:
+            rejected_token = client.auth_token
+            headers = client.get_auth_headers()
+            if (trace := current_trace.get()) is not None:
+                trace.requests += 1
+
+            # Условный запрос: сервер может ответить 304 без тела
+            if cache_entry is not None:
+                headers = dict(headers)
+                if cache_entry.etag:
+                    headers[hdrs.IF_NONE_MATCH] = cache_entry.etag
+                if cache_entry.last_modified:
+                    headers[hdrs.IF_MODIFIED_SINCE] = cache_entry.last_modified
             
-            for i, auth_data in enumerate(auth_attempts, 1):
-                _LOGGER.debug(f"Попытка авторизации {i}/{len(auth_attempts)}")
-                
-                try:
-                    async with session.post(auth_url, json=auth_data, headers=headers, timeout=30) as response:
-                        
-                        if response.status == 200:
-                            response_data = await response.json()
-                            
-                            if response_data.get('token'):
-                                self.auth_token = response_data['token']
-                                _LOGGER.info("Авторизация КСК успешна")
-                                
-                                # Сохраняем cookies если есть
-                                if response.cookies:
-                                    for cookie in response.cookies:
-                                        self.session_cookies[cookie.key] = cookie.value
-                                
-                                return
-                            elif 'success' in str(response_data).lower():
-                                _LOGGER.debug(f"Возможно успешная авторизация: {response_data}")
-                                # Пробуем извлечь токен из ответа
-                                if 'data' in response_data and isinstance(response_data['data'], dict):
-                                    if 'token' in response_data['data']:
-                                        self.auth_token = response_data['data']['token']
-                                        return
+            try:
+                async with session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    json=data if method == "POST" else None,
+                    # Для endpoint'ов время ограничивает async_api_request_handler
+                    timeout=None if endpoint else API_TIMEOUT,
+                ) as response:
+                    status = response.status
+                    if status != 401 and not (status == 304 and cache_entry is not None):
+                        response.raise_for_status()
+                        body = await response.read()
+                        etag = response.headers.get(hdrs.ETAG)
+                        last_modified = response.headers.get(hdrs.LAST_MODIFIED)
                         
-                        elif response.status in [400, 404]:
-                            error_data = await response.json()
-                            error_msg = error_data.get('message', 'Unknown error')
-                            
-                            # Если это последняя попытка, выбрасываем исключение
-                            if i == len(auth_attempts):
-                                if 'not registered' in error_msg:
-                                    raise InvalidAuth("Лицевой счет не зарегистрирован в системе")
-                                elif 'inconsistent' in error_msg:
-                                    raise InvalidAuth("Неверная пара логин/пароль")
-                                else:
-                                    raise InvalidAuth(f"Ошибка авторизации: {error_msg}")
-                        
-                        else:
-                            _LOGGER.warning(f"Неожиданный статус ответа: {response.status}")
-                            
-                except Exception as e:
-                    _LOGGER.warning(f"Ошибка в попытке авторизации {i}: {e}")
-                    if i == len(auth_attempts):
-                        raise InvalidAuth(f"Ошибка авторизации: {e}")
-                    continue
-            
-            raise InvalidAuth("Все попытки авторизации исчерпаны")
-            
-        except Exception as err:
-            _LOGGER.error("Ошибка авторизации КСК: %s", err)
-            raise InvalidAuth(f"Ошибка авторизации: {err}")
-
-    def _get_auth_headers(self) -> dict[str, str]:
-        """Получение заголовков авторизации."""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-            'Origin': 'https://svet.kaluga.ru',
-            'Referer': f'https://svet.kaluga.ru/{self.account_id}'
-        }
-        
-        if self.auth_token:
-            headers['Authorization'] = f'Bearer {self.auth_token}'
-        
-        return headers
+            except aiohttp.ClientResponseError as err:
+                _LOGGER.error("Ошибка HTTP запроса %s: %s", url, err)
+                if err.status >= 500:
+                    raise CannotConnect(f"Ошибка сервера API: {err}") from err
+                raise UpdateFailed(f"Ошибка запроса к API: {err}") from err
+            except aiohttp.ClientError as err:
+                _LOGGER.error("Ошибка HTTP запроса %s: %s", url, err)
+                raise CannotConnect(f"Ошибка запроса к API: {err}") from err
 
-    async def _make_request(self, url: str, method: str = "GET", data: dict = None) -> dict:
-        """Выполнение HTTP запроса к API КСК."""
-        session = async_get_clientsession(self.hass)
-        headers = self._get_auth_headers()
-        
-        # Добавляем cookies к сессии
-        if self.session_cookies:
-            cookie_header = "; ".join([f"{k}={v}" for k, v in self.session_cookies.items()])
-            headers['Cookie'] = cookie_header
-        
-        try:
-            if method == "POST":
-                async with session.post(url, headers=headers, json=data, timeout=30) as response:
-                    if response.status == 401:
-                        raise InvalidAuth("Токен авторизации недействителен")
-                    response.raise_for_status()
-                    return await response.json()
-            else:
-                async with session.get(url, headers=headers, timeout=30) as response:
-                    if response.status == 401:
-                        raise InvalidAuth("Токен авторизации недействителен")
-                    response.raise_for_status()
-                    return await response.json()
-                    
-        except aiohttp.ClientError as err:
-            _LOGGER.error("Ошибка HTTP запроса %s: %s", url, err)
-            raise UpdateFailed(f"Ошибка запроса к API: {err}")
+            if status != 401:
+                break
+            if reauthenticated:
+                raise InvalidAuth("Токен авторизации недействителен")
+
+            # Токен истек: авторизуемся повторно и повторяем запрос. При
+            # одновременных ошибках 401 авторизация выполняется один раз.
+            # Авторизация ограничена AUTH_TIMEOUT, а не временем запроса: при
+            # отмене запроса она продолжается и используется при повторе.
+            _LOGGER.debug("Токен КСК отклонен сервером, повторная авторизация")
+            if trace is not None:
+                trace.reauths += 1
+            await client.token_manager.async_ensure_token(rejected_token)
+            reauthenticated = True
+
+        if status == 304:
+            cache_entry.fetched = time.monotonic()
+            _count_cache_hit(metrics)
+            return cache_entry.payload
+
+        if endpoint is None:
+            return await async_json_loads(self.hass, body, transform)
+
+        metrics.bytes_received += len(body)
+
+        # Если содержимое не изменилось, переиспользуем ранее разобранный ответ
+        digest = hashlib.sha1(body, usedforsecurity=False).hexdigest()
+        if cache_entry is not None and cache_entry.digest == digest:
+            _count_cache_hit(metrics)
+            payload = cache_entry.payload
+        else:
+            payload = await async_json_loads(self.hass, body, transform)
+
+        client.endpoint_cache[url] = EndpointCacheEntry(
+            payload=payload,
+            fetched=time.monotonic(),
+            digest=digest,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        return payload
+
+    def invalidate_endpoint_cache(self) -> None:
+        """Сброс кеша ответов API, следующее обновление загрузит все данные."""
+        self.client.endpoint_cache.clear()
+
+    async def async_refresh_all(self) -> None:
+        """Полное обновление всех счетов без кеша."""
+        self.invalidate_endpoint_cache()
+        self._full_refresh = True
+        await self.async_refresh()
+
+    async def async_refresh_account(self, account_id: str) -> None:
+        """Обновление списка счетов и данных одного лицевого счета без кеша."""
+        suffix = f"/{account_id}"
+        cache = self.client.endpoint_cache
+        for url in [url for url in cache if url.endswith(suffix)]:
+            del cache[url]
+        await self.async_refresh()
+        if (child := self.accounts.get(account_id)) is not None:
+            await child.async_refresh()
 
     # API методы
+    @async_api_request_handler("user_info")
     async def _get_user_info(self) -> dict:
         """Получение информации о пользователе."""
         url = f"{API_BASE_URL}{API_USER_INFO_URL}"
-        return await self._make_request(url)
+        return await self._make_request(url, endpoint="user_info")
 
-    async def _get_accounts(self) -> list[dict]:
+    @async_api_request_handler("accounts")
+    async def _get_accounts(self) -> list[Account]:
         """Получение списка лицевых счетов."""
         url = f"{API_BASE_URL}{API_ACCOUNTS_URL}"
-        result = await self._make_request(url)
-        return result if isinstance(result, list) else [result]
+        return await self._make_request(
+            url, endpoint="accounts", transform=parse_accounts
+        )
 
+    @async_api_request_handler("account_details")
     async def _get_account_details(self, account_id: str) -> dict:
         """Получение детальной информации по лицевому счету."""
         url = f"{API_BASE_URL}{API_ACCOUNT_DETAILS_URL.format(account_id=account_id)}"
-        return await self._make_request(url)
+        return await self._make_request(url, endpoint="account_details")
 
+    @async_api_request_handler("transmission_details")
     async def _get_transmission_details(self, account_id: str) -> dict:
         """Получение деталей передачи показаний."""
         url = f"{API_BASE_URL}{API_TRANSMISSION_DETAILS_URL.format(account_id=account_id)}"
-        return await self._make_request(url)
+        return await self._make_request(url, endpoint="transmission_details")
 
+    @async_api_request_handler("meter_history")
+    async def _get_meter_history(self, account_id: str) -> MeterHistory:
+        """Получение окна истории показаний счетчиков.
 
-    async def _get_meter_history(self, account_id: str) -> list[dict]:
-        """Получение истории показаний счетчиков."""
-        try:
-            url = f"{API_BASE_URL}{API_METER_HISTORY_URL.format(account_id=account_id)}"
-            return await self._make_request(url)
-        except:
-            return []
+        Вся история из ответа передается в импорт статистики, в памяти
+        остается только окно.
+        """
+        url = f"{API_BASE_URL}{API_METER_HISTORY_URL.format(account_id=account_id)}"
 
+        def retain(entries: Any) -> MeterHistory:
+            history = MeterHistory.from_api(entries)
+            # Разбор выполняется в executor, импорт запускается в event loop
+            self.hass.loop.call_soon_threadsafe(
+                self.async_schedule_statistics_import, account_id, history, None
+            )
+            return history.window(history_window_start())
+
+        return await self._make_request(url, endpoint="meter_history", transform=retain)
+
+    @async_api_request_handler("payment_details")
     async def _get_payment_details(self, account_id: str) -> dict:
         """Получение деталей для платежа."""
-        try:
-            url = f"{API_BASE_URL}{API_PAYMENT_DETAILS_URL.format(account_id=account_id)}"
-            return await self._make_request(url)
-        except:
-            return {}
+        url = f"{API_BASE_URL}{API_PAYMENT_DETAILS_URL.format(account_id=account_id)}"
+        return await self._make_request(url, endpoint="payment_details")
 
-    async def _get_payment_history(self, account_id: str) -> list[dict]:
-        """Получение истории платежей по лицевому счету."""
-        try:
-            url = f"{API_BASE_URL}{API_PAYMENT_HISTORY_URL.format(account_id=account_id)}"
-            result = await self._make_request(url)
-            return result if isinstance(result, list) else []
-        except Exception as err:
-            _LOGGER.warning(f"Не удалось получить историю платежей для счета {account_id}: {err}")
-            return []
+    @async_api_request_handler("payment_history")
+    async def _get_payment_history(self, account_id: str) -> PaymentHistory:
+        """Получение окна истории платежей по лицевому счету.
+
+        Вся история из ответа передается в импорт статистики, в памяти
+        остается только окно.
+        """
+        url = f"{API_BASE_URL}{API_PAYMENT_HISTORY_URL.format(account_id=account_id)}"
+
+        def retain(entries: Any) -> PaymentHistory:
+            history = PaymentHistory.from_api(entries)
+            # Разбор выполняется в executor, импорт запускается в event loop
+            self.hass.loop.call_soon_threadsafe(
+                self.async_schedule_statistics_import, account_id, None, history
+            )
+            return history.window(history_window_start())
+
+        return await self._make_request(url, endpoint="payment_history", transform=retain)
+
+    @async_api_request_handler("meter_history")
+    async def _get_meter_archive(self, account_id: str) -> MeterHistory:
+        """Получение всей истории показаний в обход кеша окна."""
+        url = f"{API_BASE_URL}{API_METER_HISTORY_URL.format(account_id=account_id)}"
+        return await self._make_request(url, transform=MeterHistory.from_api)
+
+    @async_api_request_handler("payment_history")
+    async def _get_payment_archive(self, account_id: str) -> PaymentHistory:
+        """Получение всей истории платежей в обход кеша окна."""
+        url = f"{API_BASE_URL}{API_PAYMENT_HISTORY_URL.format(account_id=account_id)}"
+        return await self._make_request(url, transform=PaymentHistory.from_api)
+
+    async def _async_get_archive(
+        self, account_id: str, kind: str
+    ) -> MeterHistory | PaymentHistory:
+        """Вся история показаний или платежей для постраничной выдачи.
+
+        Разобранная история хранится в общем кеше клиента в течение TTL
+        endpoint'а, поэтому страницы одной истории загружаются одним
+        запросом, а одновременные вызовы ожидают один запрос.
+        """
+        if kind == HISTORY_READINGS:
+            endpoint, url, fetch = (
+                "meter_history",
+                API_METER_HISTORY_URL,
+                self._get_meter_archive,
+            )
+        else:
+            endpoint, url, fetch = (
+                "payment_history",
+                API_PAYMENT_HISTORY_URL,
+                self._get_payment_archive,
+            )
+        # Ключ заканчивается номером счета, как и адреса остальных ответов
+        key = f"archive:{API_BASE_URL}{url.format(account_id=account_id)}"
+        cache = self.client.endpoint_cache
+        cache_entry = cache.get(key)
+        if cache_entry is not None and cache_entry.is_fresh(ENDPOINT_TTLS[endpoint]):
+            return cache_entry.payload
+
+        history, shared = await self.client.async_shared_request(
+            key, lambda: fetch(account_id)
+        )
+        if not shared:
+            cache[key] = EndpointCacheEntry(payload=history, fetched=time.monotonic())
+        return history
+
+    async def async_iter_history_pages(
+        self, account_id: str, kind: str, page_size: int
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Страницы истории раньше окна, хранимого в памяти, от новых к старым.
+
+        kind - HISTORY_READINGS или HISTORY_PAYMENTS. Вся история
+        загружается при первом запросе страницы и используется для
+        следующих страниц в течение TTL endpoint'а; записи собираются
+        в словари по одной странице.
+        """
+        history = await self._async_get_archive(account_id, kind)
+        for page in history.iter_older_pages(history_window_start(), page_size):
+            yield page
 
     # Дополнительные методы для интеграции
-    async def submit_meter_readings(self, readings: dict) -> bool:
+    async def submit_meter_readings(
+        self, readings: dict, account_id: str | None = None
+    ) -> bool:
         """Отправка показаний счетчиков."""
         try:
-            url = f"{API_BASE_URL}/api/profile/send-meter-lk"
+            url = f"{API_BASE_URL}{API_SEND_READINGS_URL}"
             data = {
-                "account": self.account_id,
+                "account": account_id or self.account_id,
                 "readings": readings,
                 "period": datetime.now().strftime("%Y-%m")
             }
@@ -335,6 +903,112 @@ class KSKDataUpdateCoordinator(DataUpdateCoordinator):
             _LOGGER.error("Ошибка отправки показаний: %s", err)
             return False
 
+    def get_current_readings(self, account_id: str) -> dict[str, float]:
+        """Последние переданные показания счета по зонам."""
+        return {
+            reading.zone: reading.value
+            for reading in self.get_account_view(account_id).last_readings
+        }
+
+    async def async_send_readings(
+        self, account_id: str, readings: Mapping[str, float]
+    ) -> dict[str, Any]:
+        """Отправка показаний лицевого счета с проверкой повторной отправки.
+
+        Возвращает отчет со статусом: sent - показания отправлены, skipped -
+        такие показания уже переданы, rejected - показания меньше переданных
+        или зона неизвестна, failed - ошибка API.
+        """
+        current = self.get_current_readings(account_id)
+        # Показание без зоны относится к единственной (первой) зоне счета
+        if current and set(readings) == {"основной"} and "основной" not in current:
+            readings = {next(iter(current)): readings["основной"]}
+        report: dict[str, Any] = {"readings": dict(readings), "current": current}
+
+        if unknown := [zone for zone in readings if current and zone not in current]:
+            return {
+                **report,
+                "status": READINGS_REJECTED,
+                "message": f"Неизвестные зоны: {', '.join(unknown)}",
+            }
+        if lower := [
+            zone for zone, value in readings.items() if value < current.get(zone, value)
+        ]:
+            return {
+                **report,
+                "status": READINGS_REJECTED,
+                "message": f"Показания меньше переданных: {', '.join(lower)}",
+            }
+        if current and all(
+            current.get(zone) == value for zone, value in readings.items()
+        ):
+            return {
+                **report,
+                "status": READINGS_SKIPPED,
+                "message": "Показания уже переданы",
+            }
+
+        try:
+            result = await self._make_request(
+                f"{API_BASE_URL}{API_SEND_READINGS_URL}",
+                "POST",
+                {
+                    "account": account_id,
+                    "readings": dict(readings),
+                    "period": dt_util.now().strftime("%Y-%m"),
+                },
+            )
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Ошибка отправки показаний счета %s: %s", account_id, err)
+            return {**report, "status": READINGS_FAILED, "message": str(err)}
+
+        result = result if isinstance(result, dict) else {}
+        if not result.get("success", False):
+            return {**report, "status": READINGS_FAILED, "message": result.get("message")}
+
+        # Переданные показания появятся в данных передачи показаний
+        self.client.endpoint_cache.pop(
+            f"{API_BASE_URL}{API_TRANSMISSION_DETAILS_URL.format(account_id=account_id)}",
+            None,
+        )
+        if (child := self.accounts.get(account_id)) is not None:
+            await child.async_request_refresh()
+        return {**report, "status": READINGS_SENT, "message": result.get("message")}
+
+    async def async_send_readings_batch(
+        self, readings: Mapping[str, Mapping[str, float]]
+    ) -> dict[str, dict[str, Any]]:
+        """Отправка показаний нескольких счетов с ограничением параллельности.
+
+        readings - показания по зонам для каждого номера счета. Возвращает
+        отчет по каждому счету.
+        """
+        semaphore = asyncio.Semaphore(READINGS_MAX_PARALLEL)
+
+        async def send(
+            identifier: str, account_readings: Mapping[str, float]
+        ) -> dict[str, Any]:
+            if (account_id := self.find_account_id(identifier)) is None:
+                return {
+                    "status": READINGS_UNKNOWN_ACCOUNT,
+                    "readings": dict(account_readings),
+                }
+            async with semaphore:
+                return await self.async_send_readings(account_id, account_readings)
+
+        results = await asyncio.gather(
+            *(send(identifier, values) for identifier, values in readings.items())
+        )
+        report = dict(zip(readings, results))
+        _LOGGER.info(
+            "Отправка показаний КСК: %s",
+            ", ".join(
+                f"{status}: {sum(1 for item in results if item['status'] == status)}"
+                for status in dict.fromkeys(item["status"] for item in results)
+            ),
+        )
+        return report
+
     async def get_payment_link(self, amount: float) -> str:
         """Получение ссылки на оплату."""
         try:
@@ -363,4 +1037,215 @@ class KSKDataUpdateCoordinator(DataUpdateCoordinator):
                 return datetime.fromisoformat(time_str)
             return dt_util.utcnow()
         except:
-            return dt_util.utcnow()
\ No newline at end of file
+            return dt_util.utcnow()
+
+
+class KSKAccountCoordinator(DataUpdateCoordinator):
+    """Координатор обновления данных одного лицевого счета.
+
+    Запросы выполняются через родительский координатор (общие токен, сессия
+    и кеш), а интервал, повторные попытки после ошибок и доступность
+    сенсоров у каждого счета свои.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        parent: KSKDataUpdateCoordinator,
+        account: Account,
+    ) -> None:
+        """Инициализация координатора лицевого счета."""
+        self.parent = parent
+        self.account = account
+        self.account_id = account.number
+        self.shard = parent.shard_for(self.account_id)
+        self._failures = 0
+        # Первое плановое обновление группы сдвигается на долю интервала,
+        # чтобы обновления групп были разнесены по времени
+        self._stagger = (self.shard + 1) / parent.shards
+        self._changed_sections: frozenset[str] | None = None
+        self.last_refresh_trace: RefreshTrace | None = None
+        self._unsub_shard_refresh: CALLBACK_TYPE | None = None
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{self.account_id}",
+            update_interval=parent.account_update_interval,
+            request_refresh_debouncer=Debouncer(
+                hass, _LOGGER, cooldown=1.0, immediate=True
+            ),
+        )
+
+    @property
+    def compact_attributes(self) -> bool:
+        """Настройка компактных атрибутов."""
+        return self.parent.compact_attributes
+
+    @property
+    def lean_entities(self) -> bool:
+        """Настройка минимального набора включенных сенсоров."""
+        return self.parent.lean_entities
+
+    @property
+    def snapshot_restored(self) -> bool:
+        """Данные счета восстановлены из снимка и еще не обновлялись."""
+        return bool(self.data and self.data.get("restored"))
+
+    @property
+    def view(self) -> AccountView:
+        """Данные лицевого счета для сенсоров."""
+        if not self.data:
+            return _EMPTY_ACCOUNT_VIEW
+        return self.data["view"]
+
+    @callback
+    def async_schedule_shard_refresh(self, delay: timedelta) -> None:
+        """Обновление счета через delay в рамках полного обновления по группам."""
+        self._cancel_shard_refresh()
+        self._unsub_shard_refresh = async_call_later(
+            self.hass, delay, self._async_shard_refresh
+        )
+
+    async def _async_shard_refresh(self, _now: datetime) -> None:
+        """Отложенное обновление группы счета."""
+        self._unsub_shard_refresh = None
+        await self.async_refresh()
+
+    @callback
+    def _cancel_shard_refresh(self) -> None:
+        """Отмена отложенного обновления группы счета."""
+        if self._unsub_shard_refresh is not None:
+            self._unsub_shard_refresh()
+            self._unsub_shard_refresh = None
+
+    async def async_shutdown(self) -> None:
+        """Остановка координатора счета."""
+        self._cancel_shard_refresh()
+        await super().async_shutdown()
+
+    async def async_restore(
+        self, details: dict[str, Any], last_update: datetime
+    ) -> None:
+        """Заполнение данных счета из снимка без обновления."""
+        self.data = {
+            "details": details,
+            "view": await self.parent.async_build_view(self.account, details),
+            "last_update": last_update,
+            "restored": True,
+        }
+
+    async def async_set_account(self, account: Account) -> None:
+        """Обновление данных счета из списка счетов родительского координатора.
+
+        Баланс и данные счетчика приходят в списке счетов, поэтому при их
+        изменении сенсоры счета обновляются без запроса деталей.
+        """
+        if _same(self.account, account):
+            return
+        self.account = account
+        if not (data := self.data):
+            return
+        view = await self.parent.async_build_view(account, data["details"])
+        # Пока данные вычислялись, счет мог обновиться повторно
+        if self.data is not data or self.account is not account:
+            return
+        self.data = {**data, "view": view}
+        self._changed_sections = frozenset({"account"})
+        self.async_update_listeners()
+
+    def sections_changed(self, sections: frozenset[str] | None) -> bool:
+        """Проверка, изменились ли при последнем обновлении разделы счета.
+
+        sections=None означает, что сенсор зависит от всех данных.
+        """
+        if sections is None or self._changed_sections is None:
+            return True
+        return not self._changed_sections.isdisjoint(sections)
+
+    def _diff_sections(
+        self, previous: dict[str, Any] | None, data: dict[str, Any]
+    ) -> None:
+        """Определение изменившихся разделов данных счета."""
+        # После данных из снимка у основных сенсоров снимается отметка
+        # from_snapshot, поэтому обновляются все сенсоры счета
+        if not previous or previous.get("restored"):
+            self._changed_sections = None
+            return
+
+        sections = set()
+        if not _same(previous["view"].account, data["view"].account):
+            sections.add("account")
+        old_details = previous["details"]
+        for section, value in data["details"].items():
+            if not _same(old_details.get(section), value):
+                sections.add(section)
+        # Платежи за месяц зависят и от текущего месяца
+        if previous["view"].month_period != data["view"].month_period:
+            sections.add("payment_history")
+        self._changed_sections = frozenset(sections)
+
+    async def _async_update_data(self) -> dict[str, Any]:
+        """Получение деталей лицевого счета."""
+        # Пока изменения не определены, обновляются все сенсоры счета: при
+        # ошибке и после восстановления меняется доступность сенсоров
+        self._changed_sections = None
+
+        # Плановое обновление счета ведет собственную трассу, при обновлении
+        # из родительского координатора запросы попадают в его трассу
+        trace_token = None
+        if current_trace.get() is None:
+            trace = RefreshTrace(self.name)
+            trace_token = current_trace.set(trace)
+        # Бюджет повторных попыток так же: свой у планового обновления,
+        # общий с родительским при обновлении из него
+        deadline_token = None
+        if retry_deadline.get() is None:
+            deadline_token = retry_deadline.set(
+                time.monotonic() + API_RETRY_BUDGET.total_seconds()
+            )
+        try:
+            details = await self.parent.async_fetch_account(self.account_id)
+        except ConfigEntryAuthFailed:
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            # Повторяем попытку с нарастающим интервалом
+            self._failures += 1
+            self.update_interval = min(
+                UPDATE_INTERVAL * 2 ** (self._failures - 1), ACCOUNT_MAX_BACKOFF
+            )
+            _LOGGER.warning(
+                "Ошибка получения данных для счета %s (попытка %d), следующая через %s: %s",
+                self.account_id,
+                self._failures,
+                self.update_interval,
+                err,
+            )
+            raise UpdateFailed(
+                f"Ошибка получения данных счета {self.account_id}: {err}"
+            ) from err
+        else:
+            # Данные для сенсоров вычисляются вне event loop
+            view = await self.parent.async_build_view(self.account, details)
+        finally:
+            if deadline_token is not None:
+                retry_deadline.reset(deadline_token)
+            if trace_token is not None:
+                current_trace.reset(trace_token)
+                trace.finish()
+                self.last_refresh_trace = trace
+
+        self._failures = 0
+        self.update_interval = self.parent.account_update_interval * self._stagger
+        self._stagger = 1.0
+
+        now = dt_util.utcnow()
+        data = {
+            "details": details,
+            "view": view,
+            "last_update": now,
+        }
+        self._diff_sections(self.data, data)
+        self.parent.shards_updated[self.shard] = now
+        self.parent.async_save_snapshot()
+        return data
@@ -5,75 +5,170 @@ import asyncio
 from collections.abc import Awaitable, Callable, Coroutine
 from functools import wraps
 from random import randrange
+import time
 from typing import TYPE_CHECKING, Any, Concatenate, ParamSpec, TypeVar
 
 from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers.update_coordinator import UpdateFailed
 
-from .const import API_MAX_TRIES, API_RETRY_DELAY, API_TIMEOUT
+from .const import API_MAX_TRIES, API_RETRY_DELAY, API_TIMEOUT, API_TIMEOUTS
 from .exceptions import CannotConnect, InvalidAuth
+from .metrics import EndpointMetrics, current_trace, served_from_cache
+from .resilience import CIRCUIT_HALF_OPEN, retry_deadline
 
 if TYPE_CHECKING:
-    pass
+    from .coordinator import KSKDataUpdateCoordinator
 
-_KskCoordinatorT = TypeVar("_KskCoordinatorT", bound="KskCoordinator")
+_KskCoordinatorT = TypeVar("_KskCoordinatorT", bound="KSKDataUpdateCoordinator")
 _R = TypeVar("_R")
 _P = ParamSpec("_P")
 
 
+def _record_attempt(
+        metrics: EndpointMetrics,
+        name: str,
+        account: str | None,
+        started: float,
+        error: BaseException | None = None,
+) -> None:
+    """Record an API call attempt in the metrics and the current trace."""
+    metrics.record(time.monotonic() - started, error)
+    if (trace := current_trace.get()) is not None:
+        trace.add(name, started, account, error)
+
+
 def async_api_request_handler(
-        method: Callable[Concatenate[_KskCoordinatorT, _P], Awaitable[_R]],
-) -> Callable[Concatenate[_KskCoordinatorT, _P], Coroutine[Any, Any, _R]]:
-    """Handle API errors."""
-
-    @wraps(method)
-    async def wrapper(
-            self: _KskCoordinatorT, *args: _P.args, **kwargs: _P.kwargs
-    ) -> _R:
-        """Wrap an API method."""
-        try:
-            tries = 0
-            api_timeout = API_TIMEOUT
-            api_retry_delay = API_RETRY_DELAY
-            while True:
-                tries += 1
-                try:
-                    async with asyncio.timeout(api_timeout):
-                        result = await method(self, *args, **kwargs)
-
-                    if result is not None:
-                        return result
-
-                    self.logger.error(
-                        "API error while execute function %s", method.__name__
-                    )
-                    raise CannotConnect(
-                        f"API error while execute function {method.__name__}"
-                    )
+        endpoint: str | None = None,
+) -> Callable[
+    [Callable[Concatenate[_KskCoordinatorT, _P], Awaitable[_R]]],
+    Callable[Concatenate[_KskCoordinatorT, _P], Coroutine[Any, Any, _R]],
+]:
+    """Handle API errors.
 
-                except TimeoutError:
-                    api_timeout = tries * API_TIMEOUT
-                    self.logger.debug(
-                        "Function %s: Timeout connecting to КСК", method.__name__
-                    )
+    Calls are limited by the endpoint timeout from API_TIMEOUTS, retried on
+    timeouts and connection errors with growing timeouts and jittered
+    backoff while the retry budget of the current refresh allows, and rejected while
+    the coordinator circuit breaker is open.
+
+    Every attempt is recorded in the coordinator endpoint metrics and in
+    the trace of the current refresh, except calls answered from the
+    endpoint cache without a request.
+    """
+    base_timeout = API_TIMEOUTS.get(endpoint, API_TIMEOUT)
+
+    def decorator(
+            method: Callable[Concatenate[_KskCoordinatorT, _P], Awaitable[_R]],
+    ) -> Callable[Concatenate[_KskCoordinatorT, _P], Coroutine[Any, Any, _R]]:
+        @wraps(method)
+        async def wrapper(
+                self: _KskCoordinatorT, *args: _P.args, **kwargs: _P.kwargs
+        ) -> _R:
+            """Wrap an API method."""
+            breaker = self.circuit_breaker
+            counters = self.api_counters
+            name = endpoint or method.__name__
+            metrics = self.api_metrics.endpoint(name)
+            account = str(args[0]) if args else None
+            try:
+                tries = 0
+                api_timeout = base_timeout
+                api_retry_delay = API_RETRY_DELAY
+                while True:
+                    if not breaker.allow_request():
+                        counters.rejected += 1
+                        raise CannotConnect(
+                            f"Circuit breaker is open, function {method.__name__} skipped"
+                        )
 
-                if tries >= API_MAX_TRIES:
-                    raise CannotConnect(
-                        f"API error while execute function {method.__name__}"
+                    # In half-open state this call is the single probe
+                    holds_probe = breaker.state == CIRCUIT_HALF_OPEN
+                    tries += 1
+                    counters.calls += 1
+                    started = time.monotonic()
+                    cache_token = served_from_cache.set(False)
+                    try:
+                        try:
+                            async with asyncio.timeout(api_timeout):
+                                result = await method(self, *args, **kwargs)
+                        except Exception as exc:
+                            _record_attempt(metrics, name, account, started, exc)
+                            raise
+                        if not served_from_cache.get():
+                            _record_attempt(metrics, name, account, started)
+                    except TimeoutError:
+                        counters.timeouts += 1
+                        api_timeout = tries * base_timeout
+                        self.logger.debug(
+                            "Function %s: Timeout connecting to КСК", method.__name__
+                        )
+                    except CannotConnect as exc:
+                        self.logger.debug(
+                            "Function %s: Error connecting to КСК: %s",
+                            method.__name__,
+                            exc,
+                        )
+                    except (UpdateFailed, InvalidAuth, ConfigEntryAuthFailed):
+                        # The API answered (4xx, rejected credentials):
+                        # the connection works, the error is not retried
+                        breaker.record_success()
+                        raise
+                    except ValueError:
+                        # Malformed response body
+                        counters.failures += 1
+                        breaker.record_failure()
+                        raise
+                    else:
+                        if result is not None:
+                            counters.successes += 1
+                            breaker.record_success()
+                            return result
+
+                        counters.failures += 1
+                        breaker.record_failure()
+                        self.logger.error(
+                            "API error while execute function %s", method.__name__
+                        )
+                        raise CannotConnect(
+                            f"API error while execute function {method.__name__}"
+                        )
+                    finally:
+                        served_from_cache.reset(cache_token)
+                        # Cancellation or an unexpected error leaves no outcome;
+                        # the probe must not block the endpoint forever
+                        if holds_probe:
+                            breaker.release_probe()
+
+                    counters.failures += 1
+                    breaker.record_failure()
+
+                    if tries >= API_MAX_TRIES:
+                        raise CannotConnect(
+                            f"API error while execute function {method.__name__}"
+                        )
+
+                    deadline = retry_deadline.get()
+                    if deadline is not None and time.monotonic() + api_retry_delay > deadline:
+                        counters.budget_exhausted += 1
+                        raise CannotConnect(
+                            f"Retry budget exhausted for function {method.__name__}"
+                        )
+
+                    self.logger.warning(
+                        "Attempt %d/%d. Wait %d seconds and try again",
+                        tries,
+                        API_MAX_TRIES,
+                        api_retry_delay,
                     )
+                    counters.retries += 1
+                    metrics.retries += 1
+                    await asyncio.sleep(api_retry_delay)
+                    api_retry_delay += API_RETRY_DELAY + randrange(API_RETRY_DELAY)
+
+            except InvalidAuth as exc:
+                raise ConfigEntryAuthFailed("КСК auth error") from exc
+            except CannotConnect as exc:
+                raise UpdateFailed(f"Invalid response from КСК API: {exc}") from exc
+
+        return wrapper
 
-                self.logger.warning(
-                    "Attempt %d/%d. Wait %d seconds and try again",
-                    tries,
-                    API_MAX_TRIES,
-                    api_retry_delay,
-                )
-                await asyncio.sleep(api_retry_delay)
-                api_retry_delay += API_RETRY_DELAY + randrange(API_RETRY_DELAY)
-
-        except InvalidAuth as exc:
-            raise ConfigEntryAuthFailed("КСК auth error") from exc
-        except CannotConnect as exc:
-            raise UpdateFailed(f"Invalid response from КСК API: {exc}") from exc
-
-    return wrapper 
\ No newline at end of file
+    return decorator
@@ -0,0 +1,104 @@
+"""Диагностика интеграции КСК."""
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any
+
+from homeassistant.components.diagnostics import REDACTED, async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+
+from .const import CONF_ACCOUNTS, DOMAIN
+from .coordinator import KSKDataUpdateCoordinator
+from .metrics import RefreshTrace
+
+# unique_id и заголовок записи строятся из логина и номеров счетов
+TO_REDACT = {
+    CONF_ACCOUNTS,
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    "address",
+    "email",
+    "fullName",
+    "name",
+    "phone",
+    "title",
+    "token",
+    "unique_id",
+}
+
+
+def _trace(trace: RefreshTrace | None) -> dict[str, Any] | None:
+    """Трасса обновления без номеров лицевых счетов.
+
+    Номер счета есть в шагах трассы и в названии трассы координатора счета.
+    """
+    if trace is None:
+        return None
+    summary = async_redact_data(trace.as_dict(), {"account"})
+    if summary["name"] != DOMAIN:
+        summary["name"] = REDACTED
+    return summary
+
+
+def _account_histories(
+    coordinator: KSKDataUpdateCoordinator, account_id: str
+) -> dict[str, Any]:
+    """Окно истории платежей и показаний лицевого счета, хранимое в памяти."""
+    details = coordinator.get_account_details(account_id)
+    payment_history = details.get("payment_history")
+    meter_history = details.get("meter_history")
+    return {
+        "payment_history": payment_history.rows() if payment_history else [],
+        "meter_history": meter_history.rows() if meter_history else [],
+    }
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Диагностика записи конфигурации."""
+    coordinator: KSKDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    data = coordinator.data or {}
+
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "last_update": data.get("last_update"),
+        "from_snapshot": coordinator.snapshot_restored,
+        "last_refresh": asdict(coordinator.last_refresh_stats),
+        "last_refresh_trace": _trace(coordinator.last_refresh_trace),
+        "api": {
+            "counters": coordinator.api_counters.as_dict(),
+            "circuit_breaker": coordinator.circuit_breaker.state,
+            "endpoints": coordinator.api_metrics.as_dict(),
+            "shared_client_entries": len(coordinator.client.entry_ids),
+            "cached_responses": len(coordinator.client.endpoint_cache),
+        },
+        "derive": coordinator.derive_metrics.as_dict(),
+        # Счета перечислены по порядку, без номеров
+        "accounts": [
+            {
+                "last_update": coordinator.get_account_updated(account_id),
+                "last_update_success": child.last_update_success,
+                "last_refresh_trace": _trace(child.last_refresh_trace),
+                **_account_histories(coordinator, account_id),
+            }
+            for account_id, child in coordinator.accounts.items()
+        ],
+    }
+
+
+async def async_get_device_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry, device: dr.DeviceEntry
+) -> dict[str, Any]:
+    """Диагностика устройства (лицевого счета)."""
+    coordinator: KSKDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    account_id = next(
+        identifier for domain, identifier in device.identifiers if domain == DOMAIN
+    )
+    # Номер счета в API может быть числом
+    account_id = coordinator.find_account_id(account_id) or account_id
+
+    return _account_histories(coordinator, account_id)
@@ -13,4 +13,11 @@ class InvalidAuth(HomeAssistantError):
 
 
 class NoDevicesError(HomeAssistantError):
-    """Error to indicate there are no devices in account.""" 
\ No newline at end of file
+    """Error to indicate there are no devices in account.""" 
+
+class InvalidAccounts(HomeAssistantError):
+    """Error to indicate the account list of an entry is invalid."""
+
+
+class AccountsConfigured(HomeAssistantError):
+    """Error to indicate accounts are already covered by another entry."""
@@ -1,17 +1,93 @@
 """КСК helper function."""
 from __future__ import annotations
 
+from collections.abc import Callable
 from datetime import date, datetime, timedelta
+import json
+from random import randrange
 from typing import TYPE_CHECKING, Any
 
+import aiohttp
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import device_registry as dr
 from homeassistant.util import dt as dt_util, slugify
-
-from .const import ATTR_COUNTER, DOMAIN
+from homeassistant.util.ssl import get_default_context
+
+from .const import (
+    API_CONNECTIONS_PER_HOST,
+    API_DNS_CACHE_TTL,
+    API_HEADERS,
+    API_KEEPALIVE_TIMEOUT,
+    API_TIMEOUT,
+    ATTR_COUNTER,
+    DOMAIN,
+    JSON_EXECUTOR_THRESHOLD,
+    READINGS_WINDOW_END_DAY,
+    READINGS_WINDOW_START_DAY,
+    UPDATE_HOUR_BEGIN,
+    UPDATE_HOUR_END,
+    UPDATE_INTERVAL,
+)
 
 if TYPE_CHECKING:
-    from .coordinator import KskCoordinator
+    from .coordinator import KSKDataUpdateCoordinator
+
+
+def create_api_session() -> aiohttp.ClientSession:
+    """Create dedicated HTTP session for КСК API.
+
+    The session keeps alive connections to the API host, caches DNS,
+    stores cookies received on sign-in and sends common headers.
+    """
+    connector = aiohttp.TCPConnector(
+        limit_per_host=API_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=API_DNS_CACHE_TTL,
+        keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+        ssl=get_default_context(),
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        cookie_jar=aiohttp.CookieJar(),
+        headers=API_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=API_TIMEOUT),
+    )
+
+
+def json_loads(data: bytes) -> Any:
+    """Decode JSON from bytes, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_loads_transform(
+        data: bytes, transform: Callable[[Any], Any] | None
+) -> Any:
+    """Decode JSON and apply the transform to the decoded payload."""
+    payload = json_loads(data) if data else None
+    return transform(payload) if transform is not None else payload
+
+
+async def async_json_loads(
+        hass: HomeAssistant,
+        data: bytes,
+        transform: Callable[[Any], Any] | None = None,
+) -> Any:
+    """Decode JSON and apply the transform.
+
+    Large payloads are decoded in the executor. Transforms parse every
+    entry of the payload, so with a transform the decode and the transform
+    always run together in one executor job.
+    """
+    if transform is not None or len(data) > JSON_EXECUTOR_THRESHOLD:
+        return await hass.async_add_executor_job(_json_loads_transform, data, transform)
+    return _json_loads_transform(data, None)
 
 
 async def async_get_device_entry_by_device_id(
@@ -40,7 +116,7 @@ async def async_get_device_friendly_name(
 
 async def async_get_coordinator(
         hass: HomeAssistant, device_id: str | None
-) -> KskCoordinator:
+) -> KSKDataUpdateCoordinator:
     """Get coordinator for device id."""
 
     device_entry = await async_get_device_entry_by_device_id(hass, device_id)
@@ -53,6 +129,23 @@ async def async_get_coordinator(
     raise ValueError(f"Config entry for {device_id} not found")
 
 
+async def async_get_account_id(
+        hass: HomeAssistant,
+        coordinator: KSKDataUpdateCoordinator,
+        device_id: str | None,
+) -> str:
+    """Get account number for device id."""
+
+    device_entry = await async_get_device_entry_by_device_id(hass, device_id)
+    for domain, identifier in device_entry.identifiers:
+        if domain != DOMAIN:
+            continue
+        if (account_id := coordinator.find_account_id(identifier)) is not None:
+            return account_id
+
+    raise ValueError(f"Account for {device_id} not found")
+
+
 def get_float_value(hass: HomeAssistant, entity_id: str | None) -> float | None:
     """Get float value from entity state."""
     if entity_id is not None:
@@ -80,6 +173,36 @@ def get_update_interval(hour: int, minute: int, second: int) -> timedelta:
     interval = timedelta(minutes=minutes_to_next_time)
     return interval
 
+def get_adaptive_update_interval(payments_processing: bool) -> timedelta:
+    """Get update interval aligned to the billing cycle.
+
+    Data is polled every UPDATE_INTERVAL while readings are submitted and
+    while payments are being processed, otherwise at the next night time
+    between UPDATE_HOUR_BEGIN and UPDATE_HOUR_END, but not later than the
+    start of the readings window.
+    """
+    if payments_processing:
+        return UPDATE_INTERVAL
+    now = dt_util.now()
+    if READINGS_WINDOW_START_DAY <= now.day <= READINGS_WINDOW_END_DAY:
+        return UPDATE_INTERVAL
+    # Random time spreads requests of different installations
+    next_time = now.replace(
+        hour=randrange(UPDATE_HOUR_BEGIN, UPDATE_HOUR_END),
+        minute=randrange(60),
+        second=0,
+        microsecond=0,
+    )
+    if next_time <= now:
+        next_time += timedelta(days=1)
+    if now.day < READINGS_WINDOW_START_DAY:
+        window_start = now.replace(
+            day=READINGS_WINDOW_START_DAY, hour=0, minute=0, second=0, microsecond=0
+        )
+        next_time = min(next_time, window_start)
+    return next_time - now
+
+
 def get_bill_date() -> date:
     """Get first day of current month."""
     today = date.today()
@@ -0,0 +1,334 @@
+"""Компактное хранение истории показаний и платежей КСК.
+
+В памяти хранится только окно истории - текущий и предыдущий расчетные
+периоды. Даты и числа разобраны и лежат в массивах, а не в словарях
+ответа API. Более старые записи загружаются по запросу страницами.
+"""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+import heapq
+import math
+import sys
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+from .const import HISTORY_MIN_ENTRIES
+from .helpers import _to_float, get_previous_month
+from .models import DEFAULT_ZONE, PAYMENT_STATUS_ACCEPTED, Payment
+
+# Статус платежа отсутствует в записи
+_NO_STATUS = -1
+
+
+def history_window_start() -> float:
+    """Начало хранимого окна истории: первый день предыдущего расчетного периода."""
+    return dt_util.start_of_local_day(get_previous_month()).timestamp()
+
+
+def parse_timestamp(value: str | None) -> float:
+    """Время записи истории (unix time), NaN - дата не указана или не разобрана."""
+    parsed = dt_util.parse_datetime(value) if value else None
+    if parsed is None:
+        return math.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_util.get_default_time_zone())
+    return parsed.timestamp()
+
+
+def local_datetime(timestamp: float) -> datetime | None:
+    """Локальное время записи истории."""
+    if math.isnan(timestamp):
+        return None
+    return datetime.fromtimestamp(timestamp, dt_util.get_default_time_zone())
+
+
+def _isoformat(timestamp: float) -> str | None:
+    """Дата записи истории в формате ISO."""
+    if (moment := local_datetime(timestamp)) is None:
+        return None
+    return moment.isoformat()
+
+
+def _optional(value: float) -> float | None:
+    """Число из массива, None вместо NaN."""
+    return None if math.isnan(value) else value
+
+
+def _intern(value: Any) -> str | None:
+    """Повторяющиеся строки (банк, период) хранятся в одном экземпляре."""
+    return sys.intern(str(value)) if value is not None else None
+
+
+def _window_indices(timestamps: array, start: float, min_entries: int) -> list[int]:
+    """Записи окна истории в исходном порядке.
+
+    В окно входят записи не раньше start и в любом случае min_entries
+    самых новых записей.
+    """
+    newest = heapq.nlargest(
+        min_entries,
+        (index for index, value in enumerate(timestamps) if not math.isnan(value)),
+        key=timestamps.__getitem__,
+    )
+    keep = set(newest)
+    keep.update(index for index, value in enumerate(timestamps) if value >= start)
+    return sorted(keep)
+
+
+def _older_indices(timestamps: array, start: float) -> list[int]:
+    """Записи раньше начала окна, от новых к старым."""
+    return sorted(
+        (index for index, value in enumerate(timestamps) if value < start),
+        key=timestamps.__getitem__,
+        reverse=True,
+    )
+
+
+def _pages(rows: Iterable[dict[str, Any]], page_size: int) -> Iterator[list[dict[str, Any]]]:
+    """Разбиение записей на страницы по page_size."""
+    page: list[dict[str, Any]] = []
+    for row in rows:
+        page.append(row)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _iter_meter_readings(entry: dict[str, Any]) -> Iterator[tuple[str, float]]:
+    """Показания по зонам из записи истории показаний.
+
+    Запись содержит либо список зон с показаниями, либо одно показание
+    основной зоны.
+    """
+    zones = entry.get("zones")
+    if isinstance(zones, list):
+        for zone in zones:
+            reading = _to_float(zone.get("indication"))
+            if reading is not None:
+                yield zone.get("name") or DEFAULT_ZONE, reading
+        return
+
+    for key in ("indication", "value"):
+        reading = _to_float(entry.get(key))
+        if reading is not None:
+            yield DEFAULT_ZONE, reading
+            return
+
+
+def _float_column(values: Iterable[float | None]) -> array:
+    """Массив чисел из сохраненного снимка, None - NaN."""
+    return array("d", (math.nan if value is None else value for value in values))
+
+
+@dataclass(slots=True)
+class MeterHistory:
+    """История показаний: время записей и показания по зонам.
+
+    Показания каждой зоны - массив той же длины, что и время записей;
+    NaN - в записи нет показания зоны.
+    """
+
+    timestamps: array = field(default_factory=lambda: array("d"))
+    readings: dict[str, array] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        """Количество записей."""
+        return len(self.timestamps)
+
+    @classmethod
+    def from_api(cls, entries: Any) -> MeterHistory:
+        """Разбор истории показаний из ответа API."""
+        history = cls()
+        if not isinstance(entries, list):
+            return history
+        for position, entry in enumerate(entries):
+            history.timestamps.append(parse_timestamp(entry.get("date")))
+            for zone_name, reading in _iter_meter_readings(entry):
+                column = history.readings.get(zone_name)
+                if column is None:
+                    column = history.readings[zone_name] = array(
+                        "d", [math.nan] * position
+                    )
+                if len(column) > position:
+                    column[position] = reading
+                else:
+                    column.append(reading)
+            for column in history.readings.values():
+                if len(column) == position:
+                    column.append(math.nan)
+        return history
+
+    def _select(self, indices: list[int]) -> MeterHistory:
+        """Записи с указанными номерами."""
+        return MeterHistory(
+            array("d", (self.timestamps[index] for index in indices)),
+            {
+                zone: array("d", (column[index] for index in indices))
+                for zone, column in self.readings.items()
+            },
+        )
+
+    def window(self, start: float, min_entries: int = HISTORY_MIN_ENTRIES) -> MeterHistory:
+        """Окно истории, хранимое в памяти."""
+        return self._select(_window_indices(self.timestamps, start, min_entries))
+
+    def row(self, index: int) -> dict[str, Any]:
+        """Запись истории в формате ответа API."""
+        return {
+            "date": _isoformat(self.timestamps[index]),
+            "zones": [
+                {"name": zone, "indication": column[index]}
+                for zone, column in self.readings.items()
+                if not math.isnan(column[index])
+            ],
+        }
+
+    def rows(self) -> list[dict[str, Any]]:
+        """Все записи в формате ответа API."""
+        return [self.row(index) for index in range(len(self))]
+
+    def iter_older_pages(
+        self, start: float, page_size: int
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Страницы записей раньше начала окна, от новых к старым."""
+        indices = _older_indices(self.timestamps, start)
+        return _pages((self.row(index) for index in indices), page_size)
+
+
+@dataclass(slots=True)
+class PaymentHistory:
+    """История платежей: поля платежей в массивах.
+
+    Итоги считаются по всей истории из ответа API и не зависят от того,
+    какие записи хранятся в окне.
+    """
+
+    timestamps: array = field(default_factory=lambda: array("d"))
+    amounts: array = field(default_factory=lambda: array("d"))
+    statuses: array = field(default_factory=lambda: array("h"))
+    periods: list[str | None] = field(default_factory=list)
+    banks: list[str | None] = field(default_factory=list)
+    total_count: int = 0
+    accepted_count: int = 0
+    accepted_amount: float = 0.0
+
+    def __len__(self) -> int:
+        """Количество хранимых записей."""
+        return len(self.timestamps)
+
+    @classmethod
+    def from_api(cls, entries: Any) -> PaymentHistory:
+        """Разбор истории платежей из ответа API."""
+        history = cls()
+        if not isinstance(entries, list):
+            return history
+        for payment in entries:
+            amount = _to_float(payment.get("amount"))
+            status = payment.get("status")
+            history.timestamps.append(parse_timestamp(payment.get("date")))
+            history.amounts.append(math.nan if amount is None else amount)
+            history.statuses.append(
+                status
+                if isinstance(status, int) and _NO_STATUS < status < 2**15
+                else _NO_STATUS
+            )
+            history.periods.append(_intern(payment.get("period")))
+            history.banks.append(_intern(payment.get("bank")))
+            if status == PAYMENT_STATUS_ACCEPTED:
+                history.accepted_count += 1
+                history.accepted_amount += amount or 0.0
+        history.total_count = len(history.timestamps)
+        return history
+
+    @classmethod
+    def from_snapshot(cls, stored: dict[str, Any] | list[dict[str, Any]] | None) -> PaymentHistory:
+        """История из снимка данных; в старых снимках - ответ API."""
+        if not isinstance(stored, dict):
+            return cls.from_api(stored).window(history_window_start())
+        return cls(
+            _float_column(stored.get("timestamps", [])),
+            _float_column(stored.get("amounts", [])),
+            array("h", stored.get("statuses", [])),
+            [_intern(value) for value in stored.get("periods", [])],
+            [_intern(value) for value in stored.get("banks", [])],
+            stored.get("total_count", 0),
+            stored.get("accepted_count", 0),
+            stored.get("accepted_amount", 0.0),
+        )
+
+    def as_snapshot(self) -> dict[str, Any]:
+        """История для сохранения в снимке данных."""
+        return {
+            "timestamps": [_optional(value) for value in self.timestamps],
+            "amounts": [_optional(value) for value in self.amounts],
+            "statuses": list(self.statuses),
+            "periods": self.periods,
+            "banks": self.banks,
+            "total_count": self.total_count,
+            "accepted_count": self.accepted_count,
+            "accepted_amount": self.accepted_amount,
+        }
+
+    def _select(self, indices: list[int]) -> PaymentHistory:
+        """Записи с указанными номерами, итоги сохраняются."""
+        return PaymentHistory(
+            array("d", (self.timestamps[index] for index in indices)),
+            array("d", (self.amounts[index] for index in indices)),
+            array("h", (self.statuses[index] for index in indices)),
+            [self.periods[index] for index in indices],
+            [self.banks[index] for index in indices],
+            self.total_count,
+            self.accepted_count,
+            self.accepted_amount,
+        )
+
+    def window(self, start: float, min_entries: int = HISTORY_MIN_ENTRIES) -> PaymentHistory:
+        """Окно истории, хранимое в памяти."""
+        return self._select(_window_indices(self.timestamps, start, min_entries))
+
+    def accepted(self, index: int) -> bool:
+        """Платеж зачислен."""
+        return self.statuses[index] == PAYMENT_STATUS_ACCEPTED
+
+    def latest_index(self) -> int | None:
+        """Номер самого нового платежа."""
+        latest = None
+        for index, value in enumerate(self.timestamps):
+            if math.isnan(value):
+                continue
+            if latest is None or value > self.timestamps[latest]:
+                latest = index
+        return latest
+
+    def payment(self, index: int) -> Payment:
+        """Платеж с указанным номером."""
+        status = self.statuses[index]
+        return Payment(
+            local_datetime(self.timestamps[index]),
+            self.periods[index],
+            _optional(self.amounts[index]),
+            self.banks[index],
+            None if status == _NO_STATUS else status,
+        )
+
+    def row(self, index: int) -> dict[str, Any]:
+        """Платеж в формате ответа API."""
+        return self.payment(index).as_api()
+
+    def rows(self) -> list[dict[str, Any]]:
+        """Все хранимые платежи в формате ответа API."""
+        return [self.row(index) for index in range(len(self))]
+
+    def iter_older_pages(
+        self, start: float, page_size: int
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Страницы платежей раньше начала окна, от новых к старым."""
+        indices = _older_indices(self.timestamps, start)
+        return _pages((self.row(index) for index in indices), page_size)
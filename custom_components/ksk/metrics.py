@@ -0,0 +1,238 @@
+"""КСК API request metrics and refresh traces."""
+from __future__ import annotations
+
+from collections import Counter, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import time
+from typing import Any
+
+from .const import METRICS_LATENCY_SAMPLES
+
+# Trace of the refresh the current task belongs to. Tasks created by
+# asyncio.gather inherit it, so parallel requests land in the same trace.
+current_trace: ContextVar[RefreshTrace | None] = ContextVar(
+    "ksk_current_trace", default=None
+)
+
+# Set when an API call was answered from the endpoint cache (or by an
+# identical call already in flight) without a request of its own. Such
+# calls are not recorded as attempts, so latencies reflect network I/O.
+served_from_cache: ContextVar[bool] = ContextVar(
+    "ksk_served_from_cache", default=False
+)
+
+
+def _percentile(samples: list[float], percent: float) -> float | None:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return None
+    rank = max(0, min(len(samples) - 1, round(percent / 100 * len(samples)) - 1))
+    return samples[rank]
+
+
+@dataclass
+class EndpointMetrics:
+    """Metrics of one API endpoint.
+
+    Latency percentiles are computed over the last METRICS_LATENCY_SAMPLES
+    attempts, counters are cumulative.
+    """
+
+    count: int = 0
+    errors: Counter[str] = field(default_factory=Counter)
+    retries: int = 0
+    cache_hits: int = 0
+    bytes_received: int = 0
+    latencies: deque[float] = field(
+        default_factory=lambda: deque(maxlen=METRICS_LATENCY_SAMPLES)
+    )
+
+    def record(self, duration: float, error: BaseException | None = None) -> None:
+        """Register one attempt."""
+        self.count += 1
+        self.latencies.append(duration)
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+
+    @property
+    def error_count(self) -> int:
+        """Number of failed attempts."""
+        return sum(self.errors.values())
+
+    def latency_percentiles(self) -> tuple[float | None, float | None]:
+        """p50 and p95 latency, seconds."""
+        samples = sorted(self.latencies)
+        return _percentile(samples, 50), _percentile(samples, 95)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return metrics as dict."""
+        p50, p95 = self.latency_percentiles()
+        return {
+            "count": self.count,
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "bytes_received": self.bytes_received,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+@dataclass
+class StageMetrics:
+    """Timing of a processing stage that runs outside the event loop.
+
+    Durations are measured inside the worker thread and do not include
+    the time the job waited for a free executor thread.
+    """
+
+    count: int = 0
+    total: float = 0.0
+    latencies: deque[float] = field(
+        default_factory=lambda: deque(maxlen=METRICS_LATENCY_SAMPLES)
+    )
+
+    def record(self, duration: float) -> None:
+        """Register one run."""
+        self.count += 1
+        self.total += duration
+        self.latencies.append(duration)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return metrics as dict."""
+        samples = sorted(self.latencies)
+        p50, p95 = _percentile(samples, 50), _percentile(samples, 95)
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 1),
+            "duration_p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "duration_p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+        }
+
+
+class ApiMetrics:
+    """Metrics of all API endpoints."""
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.endpoints: dict[str, EndpointMetrics] = {}
+
+    def endpoint(self, name: str) -> EndpointMetrics:
+        """Metrics of the endpoint, created on first use."""
+        if (metrics := self.endpoints.get(name)) is None:
+            metrics = self.endpoints[name] = EndpointMetrics()
+        return metrics
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return metrics of all endpoints as dict."""
+        return {name: metrics.as_dict() for name, metrics in self.endpoints.items()}
+
+
+@dataclass(slots=True)
+class TraceSpan:
+    """One timed step of a refresh, times relative to the refresh start."""
+
+    name: str
+    start: float
+    end: float
+    account: str | None = None
+    error: str | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return span as dict."""
+        return {
+            "name": self.name,
+            "account": self.account,
+            "start_ms": round(self.start * 1000, 1),
+            "duration_ms": round((self.end - self.start) * 1000, 1),
+            "error": self.error,
+        }
+
+
+class RefreshTrace:
+    """Timed steps of one refresh.
+
+    The critical path is the chain of steps that determined the refresh
+    duration: starting from the step that finished last, each previous
+    link is the step that finished last before the current one started.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize the trace."""
+        self.name = name
+        self.started = time.monotonic()
+        self.duration: float | None = None
+        self.spans: list[TraceSpan] = []
+        # Requests of this refresh only: scheduled refreshes of other
+        # coordinators count into their own traces
+        self.requests = 0
+        self.cache_hits = 0
+        self.reauths = 0
+
+    def add(
+        self,
+        name: str,
+        started: float,
+        account: str | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """Add a step that started at monotonic time started and ends now."""
+        self.spans.append(
+            TraceSpan(
+                name,
+                started - self.started,
+                time.monotonic() - self.started,
+                account,
+                type(error).__name__ if error is not None else None,
+            )
+        )
+
+    @contextmanager
+    def span(self, name: str, account: str | None = None) -> Iterator[None]:
+        """Time the enclosed block as a step."""
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as err:
+            self.add(name, started, account, err)
+            raise
+        self.add(name, started, account)
+
+    def finish(self) -> None:
+        """Mark the end of the refresh."""
+        self.duration = time.monotonic() - self.started
+
+    def critical_path(self) -> list[TraceSpan]:
+        """Steps on the critical path in order of execution."""
+        path: list[TraceSpan] = []
+        remaining = sorted(self.spans, key=lambda span: span.end)
+        limit = float("inf")
+        while remaining:
+            candidates = [span for span in remaining if span.end <= limit]
+            if not candidates:
+                break
+            last = candidates[-1]
+            path.append(last)
+            limit = last.start
+            remaining = [span for span in candidates if span.end <= limit]
+        path.reverse()
+        return path
+
+    def as_dict(self, max_spans: int = 50) -> dict[str, Any]:
+        """Return trace summary as dict, slowest steps first."""
+        slowest = sorted(self.spans, key=lambda span: span.start - span.end)
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 1)
+            if self.duration is not None
+            else None,
+            "steps": len(self.spans),
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "reauths": self.reauths,
+            "critical_path": [span.as_dict() for span in self.critical_path()],
+            "slowest": [span.as_dict() for span in slowest[:max_spans]],
+        }
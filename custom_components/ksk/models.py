@@ -0,0 +1,186 @@
+"""Типизированные данные лицевых счетов КСК.
+
+Ответ API разбирается один раз при получении: числа и даты разобраны,
+неиспользуемые ключи JSON отброшены. Объекты неизменяемые, поэтому
+неизменившиеся данные сравниваются и переиспользуются без копирования.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import sys
+from typing import Any
+
+from .helpers import _to_float
+
+DEFAULT_ZONE = "основной"
+
+PAYMENT_STATUS_ACCEPTED = 1
+
+# Поля баланса и соответствующие им ключи ответа API
+_BALANCE_KEYS = {
+    "debt": "debt",
+    "penalty": "penalty",
+    "accepted": "accepted",
+    "processing": "processing",
+    "duty": "duty",
+    "sud": "sud",
+    "payment_disconnection": "paymentDisconnection",
+}
+
+
+def _name(value: Any) -> str:
+    """Название зоны, повторяющиеся названия хранятся в одном экземпляре."""
+    return sys.intern(str(value)) if value else DEFAULT_ZONE
+
+
+@dataclass(frozen=True, slots=True)
+class Balance:
+    """Баланс лицевого счета, руб."""
+
+    debt: float = 0.0
+    penalty: float = 0.0
+    accepted: float = 0.0
+    processing: float = 0.0
+    duty: float = 0.0
+    sud: float = 0.0
+    payment_disconnection: float = 0.0
+
+    @classmethod
+    def from_api(cls, data: Any) -> Balance:
+        """Разбор баланса из ответа API."""
+        if not isinstance(data, dict):
+            return cls()
+        return cls(
+            *(_to_float(data.get(key)) or 0.0 for key in _BALANCE_KEYS.values())
+        )
+
+    def as_api(self) -> dict[str, float]:
+        """Баланс в формате ответа API."""
+        return {key: getattr(self, field) for field, key in _BALANCE_KEYS.items()}
+
+
+@dataclass(frozen=True, slots=True)
+class Zone:
+    """Тарифная зона счетчика."""
+
+    name: str = DEFAULT_ZONE
+    indication: float | None = None
+    tariff: float | None = None
+
+    @classmethod
+    def from_api(cls, data: Any) -> Zone:
+        """Разбор зоны из ответа API."""
+        if not isinstance(data, dict):
+            return cls()
+        return cls(
+            _name(data.get("name")),
+            _to_float(data.get("indication")),
+            _to_float(data.get("tariff")),
+        )
+
+    def as_api(self) -> dict[str, Any]:
+        """Зона в формате ответа API."""
+        return {"name": self.name, "indication": self.indication, "tariff": self.tariff}
+
+
+def parse_zones(zones: Any) -> tuple[Zone, ...]:
+    """Разбор списка зон из ответа API."""
+    if not isinstance(zones, list):
+        return ()
+    return tuple(Zone.from_api(zone) for zone in zones)
+
+
+@dataclass(frozen=True, slots=True)
+class Reading:
+    """Последнее переданное показание зоны, кВт·ч."""
+
+    zone: str
+    value: float
+
+
+@dataclass(frozen=True, slots=True)
+class Account:
+    """Лицевой счет из списка счетов."""
+
+    number: str | int
+    address: str | None = None
+    meter_name: str | None = None
+    meter_number: str | None = None
+    zones_count: int = 1
+    has_invoice: bool = False
+    can_sbp: bool = False
+    is_before_tech: bool = False
+    balance: Balance = Balance()
+    zones: tuple[Zone, ...] = ()
+    tariffs: tuple[float | None, ...] = ()
+
+    @classmethod
+    def from_api(cls, data: dict[str, Any]) -> Account:
+        """Разбор лицевого счета из ответа API."""
+        return cls(
+            data.get("number"),
+            data.get("address"),
+            data.get("meterName"),
+            data.get("meterNumber"),
+            data.get("zonesCount", 1),
+            bool(data.get("hasInvoice", False)),
+            bool(data.get("canSBP", False)),
+            bool(data.get("isBeforeTech", False)),
+            Balance.from_api(data.get("balance")),
+            parse_zones(data.get("zones")),
+            tuple(_to_float(tariff) for tariff in data.get("tarifs") or ()),
+        )
+
+    def as_api(self) -> dict[str, Any]:
+        """Лицевой счет в формате ответа API, только используемые поля."""
+        return {
+            "number": self.number,
+            "address": self.address,
+            "meterName": self.meter_name,
+            "meterNumber": self.meter_number,
+            "zonesCount": self.zones_count,
+            "hasInvoice": self.has_invoice,
+            "canSBP": self.can_sbp,
+            "isBeforeTech": self.is_before_tech,
+            "balance": self.balance.as_api(),
+            "zones": [zone.as_api() for zone in self.zones],
+            "tarifs": list(self.tariffs),
+        }
+
+
+def parse_accounts(payload: Any) -> list[Account]:
+    """Разбор списка лицевых счетов из ответа API."""
+    entries = payload if isinstance(payload, list) else [payload]
+    return [Account.from_api(entry) for entry in entries if isinstance(entry, dict)]
+
+
+@dataclass(frozen=True, slots=True)
+class Payment:
+    """Платеж из истории платежей."""
+
+    date: datetime | None = None
+    period: str | None = None
+    amount: float | None = None
+    bank: str | None = None
+    status: int | None = None
+
+    @property
+    def accepted(self) -> bool:
+        """Платеж зачислен."""
+        return self.status == PAYMENT_STATUS_ACCEPTED
+
+    @property
+    def day(self) -> str:
+        """Дата платежа без времени в формате ISO."""
+        return self.date.date().isoformat() if self.date is not None else ""
+
+    def as_api(self) -> dict[str, Any]:
+        """Платеж в формате ответа API."""
+        return {
+            "date": self.date.isoformat() if self.date is not None else None,
+            "period": self.period,
+            "amount": self.amount,
+            "bank": self.bank,
+            "status": self.status,
+        }
@@ -0,0 +1,90 @@
+"""КСК API resilience helpers."""
+from __future__ import annotations
+
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+import time
+from typing import Any
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+# Monotonic time after which calls of the current refresh are not retried.
+# Set by the coordinator that starts the refresh; requests of account
+# coordinators refreshed from the parent share the parent's budget.
+retry_deadline: ContextVar[float | None] = ContextVar(
+    "ksk_retry_deadline", default=None
+)
+
+
+@dataclass
+class ApiCounters:
+    """Counters of API calls made through async_api_request_handler."""
+
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    retries: int = 0
+    rejected: int = 0
+    budget_exhausted: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return counters as dict."""
+        return asdict(self)
+
+
+class CircuitBreaker:
+    """Stop calling the API after consecutive failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    all calls are rejected for ``recovery_timeout`` seconds. Then a single
+    probe call is let through (half-open state): its success closes the
+    circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float) -> None:
+        """Initialize the circuit breaker."""
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be made now."""
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        if self.state == CIRCUIT_OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = CIRCUIT_HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """Let another probe through if the probe call ended without an outcome."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        """Register successful call."""
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Register failed call."""
+        self.consecutive_failures += 1
+        if (
+            self.state == CIRCUIT_HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
@@ -1,8 +1,8 @@
 """КСК Sensor definitions - расширенная версия для всех данных API."""
 from __future__ import annotations
 
+import logging
 from datetime import datetime
-from typing import Any
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
@@ -15,23 +15,55 @@ from homeassistant.const import (
     UnitOfTime,
     PERCENTAGE,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN
-from .coordinator import KSKDataUpdateCoordinator
+from .const import (
+    API_TIMEOUTS,
+    CONF_API_METRICS_SENSORS,
+    DEFAULT_API_METRICS_SENSORS,
+    DOMAIN,
+)
+from .coordinator import KSKAccountCoordinator, KSKDataUpdateCoordinator
+from .models import DEFAULT_ZONE, Account
+from .views import AccountView, limit_attributes
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def entry_device_info(coordinator: KSKDataUpdateCoordinator) -> DeviceInfo:
+    """Устройство записи интеграции: итоги по всем счетам и метрики API."""
+    return DeviceInfo(
+        identifiers={(DOMAIN, coordinator.entry.entry_id)},
+        name=f"КСК {coordinator.username}",
+        manufacturer="Калужская Сбытовая Компания",
+        model="Все лицевые счета",
+        entry_type=DeviceEntryType.SERVICE,
+    )
 
 
-class KSKBaseSensorEntity(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEntity):
-    """Базовый класс для сенсоров КСК."""
+class KSKBaseSensorEntity(CoordinatorEntity[KSKAccountCoordinator], SensorEntity):
+    """Базовый класс для сенсоров КСК.
+
+    Сенсоры лицевого счета подписаны на координатор этого счета, общие
+    сенсоры - на родительский координатор.
+    """
+
+    # Разделы данных счета, от которых зависит сенсор; состояние
+    # записывается, только если они изменились. None - при каждом обновлении.
+    _data_sections: frozenset[str] | None = None
+    # Основные сенсоры включены и в минимальном наборе сенсоров
+    _core_sensor = False
 
     def __init__(
         self,
-        coordinator: KSKDataUpdateCoordinator,
-        account_data: dict,
+        coordinator: KSKAccountCoordinator | KSKDataUpdateCoordinator,
+        account_data: Account,
         sensor_key: str,
         name: str,
         icon: str | None = None,
@@ -44,7 +76,7 @@ class KSKBaseSensorEntity(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEnt
         super().__init__(coordinator)
         
         self.account_data = account_data
-        self.account_number = account_data.get("number", "unknown")
+        self.account_number = account_data.number
         
         # Уникальный ID
         self._attr_unique_id = f"ksk_{self.account_number}_{sensor_key}"
@@ -63,31 +95,39 @@ class KSKBaseSensorEntity(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEnt
             self._attr_state_class = state_class
         if entity_category:
             self._attr_entity_category = entity_category
+        if not self._core_sensor and coordinator.lean_entities:
+            self._attr_entity_registry_enabled_default = False
         
         # Информация об устройстве
         self._attr_device_info = {
             "identifiers": {(DOMAIN, self.account_number)},
             "name": f"КСК {self.account_number}",
             "manufacturer": "Калужская Сбытовая Компания",
-            "model": account_data.get("meterName", "Электросчетчик"),
-            "sw_version": account_data.get("meterNumber"),
+            "model": account_data.meter_name or "Электросчетчик",
+            "sw_version": account_data.meter_number,
         }
 
     @property
     def available(self) -> bool:
-        """Доступность сенсора."""
-        return self.coordinator.data is not None
-    
-    def get_account_details(self, key: str = None):
-        """Получение детальных данных для конкретного лицевого счета."""
-        if not self.coordinator.data or "accounts_details" not in self.coordinator.data:
-            return {} if key else None
-            
-        account_details = self.coordinator.data["accounts_details"].get(self.account_number, {})
-        
-        if key:
-            return account_details.get(key, {})
-        return account_details
+        """Доступность сенсора: данные есть и последнее обновление успешно."""
+        return self.coordinator.last_update_success and self.coordinator.data is not None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Запись состояния, только если изменились нужные сенсору данные."""
+        if self.coordinator.sections_changed(self._data_sections):
+            super()._handle_coordinator_update()
+
+    @property
+    def view(self) -> AccountView:
+        """Предварительно вычисленные данные лицевого счета."""
+        return self.coordinator.view
+
+    def _mark_snapshot(self, attributes: dict) -> dict:
+        """Отметка атрибутов, пока данные счета восстановлены из снимка."""
+        if self.coordinator.snapshot_restored:
+            return {**attributes, "from_snapshot": True}
+        return attributes
 
 
 # =============================================================================
@@ -97,7 +137,9 @@ class KSKBaseSensorEntity(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEnt
 class KSKAccountSensor(KSKBaseSensorEntity):
     """Сенсор лицевого счета."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -115,40 +157,39 @@ class KSKAccountSensor(KSKBaseSensorEntity):
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        return {
-            "address": self.account_data.get("address"),
-            "meter_name": self.account_data.get("meterName"),
-            "meter_number": self.account_data.get("meterNumber"),
-            "zones_count": self.account_data.get("zonesCount", 1),
-            "has_invoice": self.account_data.get("hasInvoice", False),
-            "can_sbp": self.account_data.get("canSBP", False),
-            "is_before_tech": self.account_data.get("isBeforeTech", False),
-        }
+        return self.view.account_attributes
 
 
-class KSKUserInfoSensor(KSKBaseSensorEntity):
-    """Сенсор информации о пользователе."""
+class KSKUserInfoSensor(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEntity):
+    """Сенсор информации о пользователе, один на запись интеграции."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
-        super().__init__(
-            coordinator,
-            account_data,
-            "user_info",
-            "Информация о пользователе",
-            icon="mdi:account",
-            entity_category=EntityCategory.DIAGNOSTIC,
-        )
+    _attr_icon = "mdi:account"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, coordinator: KSKDataUpdateCoordinator) -> None:
+        """Инициализация сенсора."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"ksk_{coordinator.entry.entry_id}_user_info"
+        self._attr_name = f"Информация о пользователе ({coordinator.username})"
+        self._attr_device_info = entry_device_info(coordinator)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Запись состояния, только если изменилась информация о пользователе."""
+        if self.coordinator.sections_changed(frozenset({"user_info"})):
+            super()._handle_coordinator_update()
 
     @property
     def native_value(self) -> str:
         """Значение сенсора."""
-        user_info = self.coordinator.data.get("user_info", {})
+        user_info = self.coordinator.data.get("user_info") or {}
         return user_info.get("name", "Неизвестно")
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        user_info = self.coordinator.data.get("user_info", {})
+        user_info = self.coordinator.data.get("user_info") or {}
         return {
             "email": user_info.get("email"),
             "phone": user_info.get("phone"),
@@ -163,7 +204,10 @@ class KSKUserInfoSensor(KSKBaseSensorEntity):
 class KSKBalanceSensor(KSKBaseSensorEntity):
     """Сенсор задолженности."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _core_sensor = True
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -177,27 +221,20 @@ class KSKBalanceSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float:
         """Значение сенсора."""
-        balance = self.account_data.get("balance", {})
-        return balance.get("debt", 0.0)
+        return self.view.balance.debt
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        balance = self.account_data.get("balance", {})
-        return {
-            "duty": balance.get("duty", 0.0),
-            "sud": balance.get("sud", 0.0),
-            "payment_disconnection": balance.get("paymentDisconnection", 0.0),
-            "penalty": balance.get("penalty", 0.0),
-            "accepted": balance.get("accepted", 0),
-            "processing": balance.get("processing", 0),
-        }
+        return self._mark_snapshot(self.view.balance_attributes)
 
 
 class KSKPenaltySensor(KSKBaseSensorEntity):
     """Сенсор пени."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -211,14 +248,15 @@ class KSKPenaltySensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float:
         """Значение сенсора."""
-        balance = self.account_data.get("balance", {})
-        return balance.get("penalty", 0.0)
+        return self.view.balance.penalty
 
 
 class KSKAcceptedPaymentsSensor(KSKBaseSensorEntity):
     """Сенсор принятых платежей."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -232,14 +270,15 @@ class KSKAcceptedPaymentsSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float:
         """Значение сенсора."""
-        balance = self.account_data.get("balance", {})
-        return balance.get("accepted", 0.0)
+        return self.view.balance.accepted
 
 
 class KSKProcessingPaymentsSensor(KSKBaseSensorEntity):
     """Сенсор платежей в обработке."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -253,8 +292,7 @@ class KSKProcessingPaymentsSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float:
         """Значение сенсора."""
-        balance = self.account_data.get("balance", {})
-        return balance.get("processing", 0.0)
+        return self.view.balance.processing
 
 
 # =============================================================================
@@ -264,7 +302,9 @@ class KSKProcessingPaymentsSensor(KSKBaseSensorEntity):
 class KSKMeterSensor(KSKBaseSensorEntity):
     """Сенсор счетчика."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -277,22 +317,21 @@ class KSKMeterSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> str:
         """Значение сенсора."""
-        return self.account_data.get("meterName", "Неизвестно")
+        return self.view.account.meter_name or "Неизвестно"
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        return {
-            "meter_number": self.account_data.get("meterNumber"),
-            "zones_count": self.account_data.get("zonesCount", 1),
-            "is_before_tech": self.account_data.get("isBeforeTech", False),
-        }
+        return self.view.meter_attributes
 
 
 class KSKReadingsSensor(KSKBaseSensorEntity):
     """Сенсор показаний счетчика."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict, zone_name: str = "основной") -> None:
+    _core_sensor = True
+    _data_sections = frozenset({"account", "transmission_details"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account, zone_name: str = DEFAULT_ZONE) -> None:
         self.zone_name = zone_name
         super().__init__(
             coordinator,
@@ -308,79 +347,24 @@ class KSKReadingsSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float | None:
         """Значение сенсора."""
-        # Получаем показания из transmission данных для конкретного счета
-        transmission = self.get_account_details("transmission_details")
-        last_indications = transmission.get("lastIndications", [])
-        
-        # Для основной зоны берем первое значение
-        if self.zone_name == "основной" and last_indications:
-            try:
-                return float(last_indications[0])
-            except (ValueError, IndexError):
-                pass
-                
-        # Ищем в zones из transmission данных (они более актуальные)
-        zones = transmission.get("zones", [])
-        for zone in zones:
-            if zone.get("name") == self.zone_name:
-                indication = zone.get("indication")
-                if indication:
-                    try:
-                        return float(indication)
-                    except ValueError:
-                        pass
-        
-        # Если не найдено в transmission, ищем в базовых данных счета
-        zones = self.account_data.get("zones", [])
-        for zone in zones:
-            if zone.get("name") == self.zone_name:
-                indication = zone.get("indication")
-                if indication:
-                    try:
-                        return float(indication)
-                    except ValueError:
-                        pass
-        
-        return None
+        view = self.view
+        # Для основной зоны берем первое значение lastIndications
+        if self.zone_name == DEFAULT_ZONE and view.main_reading is not None:
+            return view.main_reading
+        return view.readings.get(self.zone_name)
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        transmission = self.get_account_details("transmission_details")
-        zone_info = None
-        
-        # Ищем информацию о зоне в transmission данных
-        zones = transmission.get("zones", [])
-        for zone in zones:
-            if zone.get("name") == self.zone_name:
-                zone_info = zone
-                break
-        
-        # Если не найдено, ищем в базовых данных счета
-        if not zone_info:
-            zones = self.account_data.get("zones", [])
-            for zone in zones:
-                if zone.get("name") == self.zone_name:
-                    zone_info = zone
-                    break
-        
-        attrs = {
-            "last_period": transmission.get("lastPeriod"),
-            "current_period": transmission.get("period"),
-            "zone_name": self.zone_name,
-            "account_number": self.account_number,
-        }
-        
-        if zone_info:
-            attrs["tariff"] = zone_info.get("tariff")
-            
-        return attrs
+        return self._mark_snapshot(self.view.zone_attributes.get(self.zone_name, {}))
 
 
 class KSKTariffSensor(KSKBaseSensorEntity):
     """Сенсор тарифа."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict, zone_name: str = "основной") -> None:
+    _data_sections = frozenset({"account"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account, zone_name: str = DEFAULT_ZONE) -> None:
         self.zone_name = zone_name
         super().__init__(
             coordinator,
@@ -395,17 +379,12 @@ class KSKTariffSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float | None:
         """Значение сенсора."""
-        zones = self.account_data.get("zones", [])
-        for zone in zones:
-            if zone.get("name") == self.zone_name:
-                return zone.get("tariff")
+        view = self.view
+        if self.zone_name in view.tariffs:
+            return view.tariffs[self.zone_name]
         
         # Если не найдена зона, берем первый тариф
-        tarifs = self.account_data.get("tarifs", [])
-        if tarifs:
-            return tarifs[0]
-            
-        return None
+        return view.default_tariff
 
 
 
@@ -429,7 +408,9 @@ class KSKTariffSensor(KSKBaseSensorEntity):
 class KSKLastUpdateSensor(KSKBaseSensorEntity):
     """Сенсор последнего обновления."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -449,7 +430,9 @@ class KSKLastUpdateSensor(KSKBaseSensorEntity):
 class KSKDataFreshnessSensor(KSKBaseSensorEntity):
     """Сенсор свежести данных."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -470,6 +453,17 @@ class KSKDataFreshnessSensor(KSKBaseSensorEntity):
             return int(delta.total_seconds() / 60)
         return None
 
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Дополнительные атрибуты."""
+        return {
+            "from_snapshot": self.coordinator.snapshot_restored,
+            "shard": self.coordinator.shard,
+            "shard_last_update": self.coordinator.parent.shards_updated.get(
+                self.coordinator.shard
+            ),
+        }
+
 
 # =============================================================================
 # СЕНСОРЫ ИСТОРИИ ПЛАТЕЖЕЙ
@@ -478,7 +472,11 @@ class KSKDataFreshnessSensor(KSKBaseSensorEntity):
 class KSKLastPaymentSensor(KSKBaseSensorEntity):
     """Сенсор последнего платежа."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _core_sensor = True
+    _data_sections = frozenset({"payment_history"})
+    _unrecorded_attributes = frozenset({"raw_history"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -492,48 +490,24 @@ class KSKLastPaymentSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float | None:
         """Значение сенсора - сумма последнего платежа."""
-        payment_history = self.get_account_details("payment_history")
-        
-        if payment_history and len(payment_history) > 0:
-            # Сортируем по дате, берем самый новый
-            sorted_payments = sorted(
-                payment_history, 
-                key=lambda x: x.get("date", ""), 
-                reverse=True
-            )
-            return sorted_payments[0].get("amount", 0.0)
-        return None
+        last_payment = self.view.latest_payment
+        if last_payment is None:
+            return None
+        return last_payment.amount
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        payment_history = self.get_account_details("payment_history")
-        
-        if payment_history and len(payment_history) > 0:
-            # Сортируем по дате, берем самый новый
-            sorted_payments = sorted(
-                payment_history, 
-                key=lambda x: x.get("date", ""), 
-                reverse=True
-            )
-            last_payment = sorted_payments[0]
-            
-            return {
-                "date": last_payment.get("date", "").split("T")[0],  # Только дата без времени
-                "period": last_payment.get("period"),
-                "bank": last_payment.get("bank"),
-                "status": "Зачисленный" if last_payment.get("status") == 1 else "Обработка",
-                "amount": last_payment.get("amount"),
-                "total_payments": len(payment_history),
-                "raw_history": payment_history[:5] if len(payment_history) <= 5 else payment_history[:5],  # Первые 5 платежей
-            }
-        return {}
+        return self._mark_snapshot(self.view.latest_payment_attributes)
 
 
 class KSKMonthlyPaymentsSensor(KSKBaseSensorEntity):
     """Сенсор суммы платежей за текущий месяц."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"payment_history"})
+    _unrecorded_attributes = frozenset({"month_payments"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -547,58 +521,20 @@ class KSKMonthlyPaymentsSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> float:
         """Значение сенсора - сумма платежей за текущий месяц."""
-        payment_history = self.get_account_details("payment_history")
-        
-        if not payment_history:
-            return 0.0
-            
-        from datetime import datetime
-        current_month = datetime.now().strftime("%m-%Y")
-        
-        monthly_total = 0.0
-        monthly_payments = []
-        
-        for payment in payment_history:
-            payment_period = payment.get("period", "")
-            if payment_period == current_month and payment.get("status") == 1:  # Только зачисленные платежи
-                amount = payment.get("amount", 0.0)
-                monthly_total += amount
-                monthly_payments.append(payment)
-        
-        return monthly_total
+        return self.view.month_total
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        payment_history = self.get_account_details("payment_history")
-        
-        if not payment_history:
-            return {"month_payments": [], "count": 0}
-            
-        from datetime import datetime
-        current_month = datetime.now().strftime("%m-%Y")
-        
-        monthly_payments = []
-        for payment in payment_history:
-            payment_period = payment.get("period", "")
-            if payment_period == current_month and payment.get("status") == 1:
-                monthly_payments.append({
-                    "date": payment.get("date", "").split("T")[0],
-                    "amount": payment.get("amount"),
-                    "bank": payment.get("bank"),
-                })
-        
-        return {
-            "month_payments": monthly_payments,
-            "count": len(monthly_payments),
-            "period": current_month,
-        }
+        return self.view.month_attributes
 
 
 class KSKPaymentCountSensor(KSKBaseSensorEntity):
     """Сенсор количества платежей."""
 
-    def __init__(self, coordinator: KSKDataUpdateCoordinator, account_data: dict) -> None:
+    _data_sections = frozenset({"payment_history"})
+
+    def __init__(self, coordinator: KSKAccountCoordinator, account_data: Account) -> None:
         super().__init__(
             coordinator,
             account_data,
@@ -612,33 +548,179 @@ class KSKPaymentCountSensor(KSKBaseSensorEntity):
     @property
     def native_value(self) -> int:
         """Значение сенсора - общее количество платежей."""
-        payment_history = self.get_account_details("payment_history")
-        return len(payment_history) if payment_history else 0
+        return self.view.payments_count
 
     @property
     def extra_state_attributes(self) -> dict:
         """Дополнительные атрибуты."""
-        payment_history = self.get_account_details("payment_history")
-        
-        if not payment_history:
-            return {"successful": 0, "processing": 0}
-            
-        successful = sum(1 for p in payment_history if p.get("status") == 1)
-        processing = sum(1 for p in payment_history if p.get("status") != 1)
-        
-        return {
-            "successful": successful,
-            "processing": processing,
-            "total_amount": sum(p.get("amount", 0.0) for p in payment_history if p.get("status") == 1),
-        }
+        return self.view.payment_count_attributes
+
+
+
+
+# =============================================================================
+# ИТОГИ ПО ВСЕМ СЧЕТАМ
+# =============================================================================
+
+class KSKPortfolioSensor(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEntity):
+    """Итог по всем лицевым счетам записи с разбивкой по районам."""
+
+    def __init__(
+        self,
+        coordinator: KSKDataUpdateCoordinator,
+        key: str,
+        name: str,
+        icon: str,
+        unit: str | None = "RUB",
+        device_class: SensorDeviceClass | None = SensorDeviceClass.MONETARY,
+    ) -> None:
+        """Инициализация сенсора."""
+        super().__init__(coordinator)
+        self.key = key
+        self._attr_unique_id = f"ksk_{coordinator.entry.entry_id}_portfolio_{key}"
+        self._attr_name = f"{name} ({coordinator.username})"
+        self._attr_icon = icon
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        if device_class is None:
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_device_info = entry_device_info(coordinator)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Запись состояния, только если изменился список счетов."""
+        if self.coordinator.sections_changed(frozenset({"accounts"})):
+            super()._handle_coordinator_update()
+
+    @property
+    def native_value(self) -> float | int:
+        """Значение сенсора."""
+        return self.coordinator.portfolio.totals.get(self.key)
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Дополнительные атрибуты - итоги по районам."""
+        portfolio = self.coordinator.portfolio
+        return limit_attributes({
+            "accounts": portfolio.totals.accounts,
+            "districts": {
+                district: totals.get(self.key)
+                for district, totals in sorted(portfolio.districts.items())
+            },
+        })
+
+
+# =============================================================================
+# СЕНСОРЫ МЕТРИК API
+# =============================================================================
 
+class KSKApiEndpointSensor(CoordinatorEntity[KSKDataUpdateCoordinator], SensorEntity):
+    """Сенсор метрик endpoint'а API: задержка p95 и счетчики запросов."""
 
+    _attr_icon = "mdi:timer-sand"
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: KSKDataUpdateCoordinator, endpoint: str) -> None:
+        """Инициализация сенсора."""
+        super().__init__(coordinator)
+        self.endpoint = endpoint
+        entry = coordinator.entry
+        self._attr_unique_id = f"ksk_{entry.entry_id}_api_{endpoint}"
+        self._attr_name = f"API {endpoint} p95 ({coordinator.username})"
+        self._attr_device_info = entry_device_info(coordinator)
+
+    @property
+    def native_value(self) -> float | None:
+        """Значение сенсора - задержка p95, мс."""
+        return self.coordinator.api_metrics.endpoint(self.endpoint).as_dict()[
+            "latency_p95_ms"
+        ]
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Дополнительные атрибуты."""
+        return limit_attributes(
+            self.coordinator.api_metrics.endpoint(self.endpoint).as_dict()
+        )
 
 
 # =============================================================================
 # НАСТРОЙКА СЕНСОРОВ
 # =============================================================================
 
+def create_entities(coordinator: KSKDataUpdateCoordinator) -> list[SensorEntity]:
+    """Сенсоры записи интеграции: по каждому счету и общие."""
+    entities: list[SensorEntity] = [KSKUserInfoSensor(coordinator)]
+
+    for account in (coordinator.data or {}).get("accounts") or []:
+        account_number = account.number
+        if account_number not in coordinator.accounts:
+            continue
+        # Сенсоры счета подписаны на координатор этого счета
+        account_coordinator = coordinator.accounts[account_number]
+
+        # Основные сенсоры для каждого счета
+        entities.extend([
+            # Основная информация
+            KSKAccountSensor(account_coordinator, account),
+
+            # Финансовые сенсоры
+            KSKBalanceSensor(account_coordinator, account),
+            KSKPenaltySensor(account_coordinator, account),
+            KSKAcceptedPaymentsSensor(account_coordinator, account),
+            KSKProcessingPaymentsSensor(account_coordinator, account),
+
+            # История платежей
+            KSKLastPaymentSensor(account_coordinator, account),
+            KSKMonthlyPaymentsSensor(account_coordinator, account),
+            KSKPaymentCountSensor(account_coordinator, account),
+
+            # Счетчик и показания
+            KSKMeterSensor(account_coordinator, account),
+
+            # История (meter_history есть в KSKReadingsSensor)
+
+            # Технические
+            KSKLastUpdateSensor(account_coordinator, account),
+            KSKDataFreshnessSensor(account_coordinator, account),
+        ])
+
+        # Сенсоры показаний и тарифов для каждой зоны, без зон - основная
+        for zone_name in [zone.name for zone in account.zones] or [DEFAULT_ZONE]:
+            entities.extend([
+                KSKReadingsSensor(account_coordinator, account, zone_name),
+                KSKTariffSensor(account_coordinator, account, zone_name),
+            ])
+
+    # Итоги по всем счетам
+    entities.extend([
+        KSKPortfolioSensor(coordinator, "debt", "Общая задолженность", "mdi:cash-multiple"),
+        KSKPortfolioSensor(coordinator, "penalty", "Общие пени", "mdi:alert-circle"),
+        KSKPortfolioSensor(coordinator, "accepted", "Всего принятые платежи", "mdi:check-circle"),
+        KSKPortfolioSensor(coordinator, "processing", "Всего платежи в обработке", "mdi:clock-outline"),
+        KSKPortfolioSensor(
+            coordinator,
+            "in_arrears",
+            "Счета с задолженностью",
+            "mdi:account-alert",
+            unit="шт",
+            device_class=None,
+        ),
+    ])
+
+    if coordinator.entry.options.get(
+        CONF_API_METRICS_SENSORS, DEFAULT_API_METRICS_SENSORS
+    ):
+        entities.extend(
+            KSKApiEndpointSensor(coordinator, endpoint) for endpoint in API_TIMEOUTS
+        )
+
+    return entities
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
@@ -647,58 +729,12 @@ async def async_setup_entry(
     """Настройка сенсоров КСК."""
     coordinator: KSKDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
 
-    entities = []
-    
-    # Получаем все лицевые счета
-    if coordinator.data and "accounts" in coordinator.data:
-        accounts = coordinator.data["accounts"]
-        
-        for account in accounts:
-            account_number = account.get("number")
-            if not account_number:
-                continue
-                
-            # Основные сенсоры для каждого счета
-            entities.extend([
-                # Основная информация
-                KSKAccountSensor(coordinator, account),
-                KSKUserInfoSensor(coordinator, account),
-                
-                # Финансовые сенсоры
-                KSKBalanceSensor(coordinator, account),
-                KSKPenaltySensor(coordinator, account),
-                KSKAcceptedPaymentsSensor(coordinator, account),
-                KSKProcessingPaymentsSensor(coordinator, account),
-                
-                # История платежей
-                KSKLastPaymentSensor(coordinator, account),
-                KSKMonthlyPaymentsSensor(coordinator, account),
-                KSKPaymentCountSensor(coordinator, account),
-                
-                # Счетчик и показания
-                KSKMeterSensor(coordinator, account),
-                
-                # История (meter_history есть в KSKReadingsSensor)
-                
-                # Технические
-                KSKLastUpdateSensor(coordinator, account),
-                KSKDataFreshnessSensor(coordinator, account),
-            ])
-            
-            # Сенсоры показаний и тарифов для каждой зоны
-            zones = account.get("zones", [])
-            if not zones:
-                # Если зон нет, создаем основную зону
-                entities.extend([
-                    KSKReadingsSensor(coordinator, account, "основной"),
-                    KSKTariffSensor(coordinator, account, "основной"),
-                ])
-            else:
-                for zone in zones:
-                    zone_name = zone.get("name", "основной")
-                    entities.extend([
-                        KSKReadingsSensor(coordinator, account, zone_name),
-                        KSKTariffSensor(coordinator, account, zone_name),
-                    ])
-
-    async_add_entities(entities) 
\ No newline at end of file
+    # Информация о пользователе раньше создавалась для каждого счета
+    registry = er.async_get(hass)
+    for account_id in coordinator.accounts:
+        if entity_id := registry.async_get_entity_id(
+            "sensor", DOMAIN, f"ksk_{account_id}_user_info"
+        ):
+            registry.async_remove(entity_id)
+
+    async_add_entities(create_entities(coordinator))
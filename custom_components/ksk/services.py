@@ -3,33 +3,56 @@
 from __future__ import annotations
 
 from collections.abc import Awaitable, Callable
+from contextlib import aclosing
 from dataclasses import dataclass
+import asyncio
 import logging
 from typing import Any
-from urllib.parse import unquote
 
 import voluptuous as vol
 
-from homeassistant.const import ATTR_DATE, ATTR_DEVICE_ID, CONF_ERROR, CONF_URL
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.const import ATTR_DEVICE_ID, CONF_ERROR
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.service import verify_domain_control
 
 from .const import (
-    ATTR_COUNTERS,
-    ATTR_EMAIL,
+    ATTR_ENTRIES,
+    ATTR_HAS_MORE,
+    ATTR_HISTORY,
     ATTR_MESSAGE,
+    ATTR_PAGE,
+    ATTR_PAGE_SIZE,
     ATTR_READINGS,
     ATTR_SENT,
+    ATTR_STATUS,
     ATTR_VALUE,
+    CONF_ACCOUNTS,
     DOMAIN,
-    SERVICE_GET_BILL,
+    HISTORY_MAX_PAGE_SIZE,
+    HISTORY_PAGE_SIZE,
+    HISTORY_PAYMENTS,
+    HISTORY_READINGS,
+    READINGS_SENT,
+    READINGS_SKIPPED,
+    READINGS_UNKNOWN_ACCOUNT,
+    SERVICE_GET_HISTORY,
     SERVICE_REFRESH,
     SERVICE_SEND_READINGS,
+    SERVICE_SEND_READINGS_BATCH,
+)
+from .coordinator import KSKDataUpdateCoordinator
+from .helpers import (
+    async_get_account_id,
+    async_get_coordinator,
+    get_float_value,
 )
-from .coordinator import KskCoordinator
-from .helpers import async_get_coordinator, get_bill_date, get_float_value, get_previous_month
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -50,14 +73,31 @@ SERVICE_SEND_READINGS_SCHEMA = vol.Schema(
     ),
 )
 
-SERVICE_GET_BILL_SCHEMA = vol.Schema(
+# Показания по номерам счетов: число (основная зона) или показания по зонам
+SERVICE_SEND_READINGS_BATCH_SCHEMA = vol.Schema(
     {
-        **SERVICE_BASE_SCHEMA,
-        vol.Optional(ATTR_DATE): cv.date,
-        vol.Optional(ATTR_EMAIL): vol.Email(),
-    },
+        vol.Required(ATTR_READINGS): vol.Schema(
+            {
+                cv.string: vol.Any(
+                    vol.Coerce(float), vol.Schema({cv.string: vol.Coerce(float)})
+                )
+            }
+        ),
+    }
 )
 
+SERVICE_GET_HISTORY_SCHEMA = vol.Schema(
+    {
+        **SERVICE_BASE_SCHEMA,
+        vol.Required(ATTR_HISTORY): vol.In([HISTORY_READINGS, HISTORY_PAYMENTS]),
+        vol.Optional(ATTR_PAGE, default=1): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(ATTR_PAGE_SIZE, default=HISTORY_PAGE_SIZE): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=HISTORY_MAX_PAGE_SIZE)
+        ),
+    }
+)
 
 @dataclass
 class ServiceDescription:
@@ -65,76 +105,46 @@ class ServiceDescription:
 
     name: str
     service_func: Callable[
-        [HomeAssistant, ServiceCall, KskCoordinator], Awaitable[dict[str, Any]]
+        [HomeAssistant, ServiceCall, KSKDataUpdateCoordinator], Awaitable[dict[str, Any]]
     ]
     schema: vol.Schema | None = None
 
 
 async def _async_handle_refresh(
-    hass: HomeAssistant, service_call: ServiceCall, coordinator: KskCoordinator
+    hass: HomeAssistant, service_call: ServiceCall, coordinator: KSKDataUpdateCoordinator
 ) -> dict[str, Any]:
-    await coordinator.async_refresh()
+    # Обновляется только счет устройства, остальные по своему расписанию
+    account_id = await async_get_account_id(
+        hass, coordinator, service_call.data.get(ATTR_DEVICE_ID)
+    )
+    await coordinator.async_refresh_account(account_id)
     return {}
 
 
 async def _async_handle_send_readings(
-    hass: HomeAssistant, service_call: ServiceCall, coordinator: KskCoordinator
+    hass: HomeAssistant, service_call: ServiceCall, coordinator: KSKDataUpdateCoordinator
 ) -> dict[str, Any]:
     value = int(
         round(
             get_float_value(hass, service_call.data.get(ATTR_VALUE)) + 0.5
         )  # round to greater integer
     )
-    device_id = service_call.data.get(ATTR_DEVICE_ID)
-    result = await coordinator.async_send_readings(device_id, value)
-
-    if result is None:
-        raise HomeAssistantError(f"{service_call.service}: Empty response from API.")
-
-    if not isinstance(result, list) or len(result) == 0:
-        raise HomeAssistantError(
-            f"{service_call.service}: Unrecognised response from API: {result}"
-        )
-
-    counters = result[0].get(ATTR_COUNTERS)
-
-    if counters is None or not isinstance(counters, list) or len(counters) == 0:
-        raise HomeAssistantError(
-            f"{service_call.service}: Unrecognised response from API: {result}"
-        )
-
-    counter = counters[0]  # single counter for account
+    account_id = await async_get_account_id(
+        hass, coordinator, service_call.data.get(ATTR_DEVICE_ID)
+    )
+    result = await coordinator.async_send_readings(account_id, {"основной": value})
 
-    message = counter.get(ATTR_MESSAGE)
-    sent = counter.get(ATTR_SENT)
-    if not sent:
+    status = result[ATTR_STATUS]
+    if status not in (READINGS_SENT, READINGS_SKIPPED):
         raise HomeAssistantError(
-            f"{service_call.service}: Readings not sent: {message}"
+            f"{service_call.service}: Readings not sent ({status}): "
+            f"{result.get(ATTR_MESSAGE)}"
         )
 
-    return {ATTR_READINGS: value, ATTR_SENT: sent, ATTR_MESSAGE: message}
-
-
-async def _async_handle_get_bill(
-    hass: HomeAssistant, service_call: ServiceCall, coordinator: KskCoordinator
-) -> dict[str, Any]:
-    device_id = service_call.data.get(ATTR_DEVICE_ID)
-    bill_date = service_call.data.get(ATTR_DATE, get_bill_date())
-    email = service_call.data.get(ATTR_EMAIL)
-
-    result = await coordinator.async_get_bill(device_id, bill_date, email)
-
-    if result is None:
-        raise HomeAssistantError(f"{service_call.service}: Empty response from API.")
-    url = result.get(CONF_URL)
-    if url is None and email is None:
-        raise HomeAssistantError(
-            f"{service_call.service}: Unrecognised response from API: {result}"
-        )
     return {
-        ATTR_DATE: bill_date,
-        CONF_URL: unquote(url) if url else None,
-        ATTR_EMAIL: unquote(email) if email else None,
+        ATTR_READINGS: value,
+        ATTR_SENT: status == READINGS_SENT,
+        ATTR_MESSAGE: result.get(ATTR_MESSAGE),
     }
 
 
@@ -145,9 +155,6 @@ SERVICES: dict[str, ServiceDescription] = {
     SERVICE_SEND_READINGS: ServiceDescription(
         SERVICE_SEND_READINGS, _async_handle_send_readings, SERVICE_SEND_READINGS_SCHEMA
     ),
-    SERVICE_GET_BILL: ServiceDescription(
-        SERVICE_GET_BILL, _async_handle_get_bill, SERVICE_GET_BILL_SCHEMA
-    ),
 }
 
 
@@ -201,9 +208,103 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             DOMAIN, service.name, _async_handle_service, schema=service.schema
         )
 
+    async def _async_handle_send_readings_batch(
+        service_call: ServiceCall,
+    ) -> ServiceResponse:
+        """Send readings of many accounts, possibly of different entries."""
+        coordinators: list[KSKDataUpdateCoordinator] = list(
+            hass.data.get(DOMAIN, {}).values()
+        )
+        report: dict[str, Any] = {}
+        batches: dict[KSKDataUpdateCoordinator, dict[str, dict[str, float]]] = {}
+        for identifier, values in service_call.data[ATTR_READINGS].items():
+            readings = values if isinstance(values, dict) else {"основной": values}
+            coordinator = next(
+                (
+                    coordinator
+                    for coordinator in coordinators
+                    if coordinator.find_account_id(identifier) is not None
+                ),
+                None,
+            )
+            if coordinator is None:
+                report[identifier] = {
+                    ATTR_STATUS: READINGS_UNKNOWN_ACCOUNT,
+                    ATTR_READINGS: readings,
+                }
+                continue
+            batches.setdefault(coordinator, {})[identifier] = readings
+
+        for result in await asyncio.gather(
+            *(
+                coordinator.async_send_readings_batch(readings)
+                for coordinator, readings in batches.items()
+            )
+        ):
+            report.update(result)
+
+        summary: dict[str, int] = {}
+        for result in report.values():
+            summary[result[ATTR_STATUS]] = summary.get(result[ATTR_STATUS], 0) + 1
+        hass.bus.async_fire(
+            event_type=f"{DOMAIN}_{service_call.service}_completed",
+            event_data=summary,
+            context=service_call.context,
+        )
+        return {CONF_ACCOUNTS: report}
+
+    if not hass.services.has_service(DOMAIN, SERVICE_SEND_READINGS_BATCH):
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_SEND_READINGS_BATCH,
+            verify_domain_control(hass, DOMAIN)(_async_handle_send_readings_batch),
+            schema=SERVICE_SEND_READINGS_BATCH_SCHEMA,
+            supports_response=SupportsResponse.OPTIONAL,
+        )
+
+    async def _async_handle_get_history(service_call: ServiceCall) -> ServiceResponse:
+        """Return a page of history older than the window kept in memory."""
+        device_id = service_call.data[ATTR_DEVICE_ID]
+        kind = service_call.data[ATTR_HISTORY]
+        page_number = service_call.data[ATTR_PAGE]
+        coordinator = await async_get_coordinator(hass, device_id)
+        account_id = await async_get_account_id(hass, coordinator, device_id)
+
+        entries: list[dict[str, Any]] = []
+        has_more = False
+        async with aclosing(
+            coordinator.async_iter_history_pages(
+                account_id, kind, service_call.data[ATTR_PAGE_SIZE]
+            )
+        ) as pages:
+            number = 0
+            async for page in pages:
+                number += 1
+                if number > page_number:
+                    has_more = True
+                    break
+                if number == page_number:
+                    entries = page
+
+        return {
+            ATTR_HISTORY: kind,
+            ATTR_PAGE: page_number,
+            ATTR_ENTRIES: entries,
+            ATTR_HAS_MORE: has_more,
+        }
+
+    if not hass.services.has_service(DOMAIN, SERVICE_GET_HISTORY):
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_GET_HISTORY,
+            verify_domain_control(hass, DOMAIN)(_async_handle_get_history),
+            schema=SERVICE_GET_HISTORY_SCHEMA,
+            supports_response=SupportsResponse.ONLY,
+        )
+
 
 async def async_unload_services(hass: HomeAssistant) -> None:
     """Unload the КСК services."""
-    for service in SERVICES.values():
-        if hass.services.has_service(DOMAIN, service.name):
-            hass.services.async_remove(DOMAIN, service.name) 
\ No newline at end of file
+    for service in [*SERVICES, SERVICE_SEND_READINGS_BATCH, SERVICE_GET_HISTORY]:
+        if hass.services.has_service(DOMAIN, service):
+            hass.services.async_remove(DOMAIN, service) 
\ No newline at end of file
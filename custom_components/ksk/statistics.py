@@ -0,0 +1,251 @@
+"""Импорт истории показаний и платежей КСК в долгосрочную статистику."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+import logging
+import math
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+
+try:
+    from homeassistant.components.recorder.models import StatisticMeanType
+except ImportError:  # pragma: no cover - Home Assistant до 2025.4
+    StatisticMeanType = None
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN
+from .history import MeterHistory, PaymentHistory, local_datetime
+
+_LOGGER = logging.getLogger(__name__)
+
+CURRENCY_RUB = "RUB"
+UNIT_CLASS_ENERGY = "energy"
+
+# Поля метаданных, которые поддерживает установленный recorder
+_METADATA_KEYS = frozenset(StatisticMetaData.__annotations__)
+
+
+def _hour_start(timestamp: float) -> datetime | None:
+    """Начало часа, к которому относится запись истории."""
+    if (moment := local_datetime(timestamp)) is None:
+        return None
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _month_start(moment: datetime) -> datetime:
+    """Начало месяца, к которому относится момент времени."""
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def monthly_rows(
+    points: list[tuple[datetime, float, float]],
+) -> list[tuple[datetime, float, float]]:
+    """Помесячные строки ряда: (начало месяца, значение за месяц, сумма).
+
+    Используются только завершенные месяцы: итоги текущего месяца еще
+    меняются, а добавленный период ряда повторно не импортируется.
+    """
+    current_month = _month_start(dt_util.now())
+    totals: dict[datetime, float] = {}
+    for start, _state, total in points:
+        month = _month_start(start)
+        if month < current_month:
+            totals[month] = total
+    rows = []
+    previous = 0.0
+    for month, total in sorted(totals.items()):
+        rows.append((month, total - previous, total))
+        previous = total
+    return rows
+
+
+def meter_statistics(
+    meter_history: MeterHistory,
+) -> dict[str, list[tuple[datetime, float]]]:
+    """Показания по зонам в порядке времени: зона -> [(начало часа, показание)]."""
+    series: dict[str, dict[datetime, float]] = {}
+    for index, timestamp in enumerate(meter_history.timestamps):
+        if (start := _hour_start(timestamp)) is None:
+            continue
+        for zone_name, column in meter_history.readings.items():
+            if not math.isnan(reading := column[index]):
+                series.setdefault(zone_name, {})[start] = reading
+    return {zone: sorted(points.items()) for zone, points in series.items()}
+
+
+def payment_statistics(
+    payment_history: PaymentHistory,
+) -> list[tuple[datetime, float]]:
+    """Зачисленные платежи по часам в порядке времени: [(начало часа, сумма)]."""
+    amounts: dict[datetime, float] = {}
+    for index, timestamp in enumerate(payment_history.timestamps):
+        if not payment_history.accepted(index):
+            continue
+        if (start := _hour_start(timestamp)) is None:
+            continue
+        amount = payment_history.amounts[index]
+        amounts[start] = amounts.get(start, 0.0) + (0.0 if math.isnan(amount) else amount)
+    return sorted(amounts.items())
+
+
+def _metadata(
+    statistic_id: str, name: str, unit: str, unit_class: str | None
+) -> StatisticMetaData:
+    """Метаданные ряда статистики.
+
+    Новые версии recorder предупреждают об устаревшем has_mean и об
+    отсутствии unit_class, поэтому поля задаются по поддержке recorder.
+    """
+    metadata = StatisticMetaData(
+        has_sum=True,
+        name=name,
+        source=DOMAIN,
+        statistic_id=statistic_id,
+        unit_of_measurement=unit,
+    )
+    if StatisticMeanType is not None and "mean_type" in _METADATA_KEYS:
+        metadata["mean_type"] = StatisticMeanType.NONE
+    else:
+        metadata["has_mean"] = False
+    if "unit_class" in _METADATA_KEYS:
+        metadata["unit_class"] = unit_class
+    return metadata
+
+
+class KSKStatisticsImporter:
+    """Инкрементальный импорт истории во внешнюю статистику Home Assistant.
+
+    Для каждого ряда статистики хранится отметка последнего импортированного
+    часа и накопленной суммы, в recorder добавляются только новые периоды.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Инициализация импорта статистики."""
+        self.hass = hass
+        self._high_water_marks: dict[str, tuple[float, float]] = {}
+        # Импорт одного ряда из обновления счета и полного обновления
+        # выполняется по очереди, иначе оба прочитают одну отметку
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def async_import_account(
+        self,
+        account_id: str,
+        meter_history: MeterHistory | None,
+        payment_history: PaymentHistory | None,
+    ) -> None:
+        """Импорт истории показаний и платежей лицевого счета.
+
+        Импортируется вся история из ответа API, а не только окно,
+        хранимое в памяти. Кроме почасовых рядов импортируются помесячные:
+        потребление и платежи за каждый завершенный месяц.
+        """
+        if meter_history is not None:
+            for zone_name, points in meter_statistics(meter_history).items():
+                # Сумма - потребление с первого известного показания
+                first_reading = points[0][1]
+                rows = [
+                    (start, reading, reading - first_reading)
+                    for start, reading in points
+                ]
+                await self._async_import_series(
+                    f"{DOMAIN}:{slugify(f'{account_id}_{zone_name}_energy')}",
+                    f"КСК {account_id} потребление ({zone_name})",
+                    UnitOfEnergy.KILO_WATT_HOUR,
+                    UNIT_CLASS_ENERGY,
+                    rows,
+                )
+                await self._async_import_series(
+                    f"{DOMAIN}:{slugify(f'{account_id}_{zone_name}_monthly_energy')}",
+                    f"КСК {account_id} потребление за месяц ({zone_name})",
+                    UnitOfEnergy.KILO_WATT_HOUR,
+                    UNIT_CLASS_ENERGY,
+                    monthly_rows(rows),
+                )
+
+        if payment_history is not None:
+            points = payment_statistics(payment_history)
+            total = 0.0
+            rows = []
+            for start, amount in points:
+                total += amount
+                rows.append((start, amount, total))
+            await self._async_import_series(
+                f"{DOMAIN}:{slugify(f'{account_id}_payments')}",
+                f"КСК {account_id} платежи",
+                CURRENCY_RUB,
+                None,
+                rows,
+            )
+            await self._async_import_series(
+                f"{DOMAIN}:{slugify(f'{account_id}_monthly_payments')}",
+                f"КСК {account_id} платежи за месяц",
+                CURRENCY_RUB,
+                None,
+                monthly_rows(rows),
+            )
+
+    async def _async_import_series(
+        self,
+        statistic_id: str,
+        name: str,
+        unit: str,
+        unit_class: str | None,
+        rows: list[tuple[datetime, float, float]],
+    ) -> None:
+        """Добавление в статистику строк новее отметки ряда."""
+        if not rows:
+            return
+
+        async with self._locks.setdefault(statistic_id, asyncio.Lock()):
+            if statistic_id not in self._high_water_marks:
+                self._high_water_marks[statistic_id] = await self._async_get_last(
+                    statistic_id
+                )
+            last_start, last_sum = self._high_water_marks[statistic_id]
+
+            # Суммы рассчитаны от начала доступной истории; если история
+            # в ответе API короче уже импортированной, продолжаем от отметки
+            offset = 0.0
+            new_rows = [row for row in rows if row[0].timestamp() > last_start]
+            if not new_rows:
+                return
+            older = [row for row in rows if row[0].timestamp() <= last_start]
+            if older:
+                offset = last_sum - older[-1][2]
+            elif last_start:
+                offset = last_sum
+
+            statistics = [
+                StatisticData(start=start, state=state, sum=total + offset)
+                for start, state, total in new_rows
+            ]
+            async_add_external_statistics(
+                self.hass, _metadata(statistic_id, name, unit, unit_class), statistics
+            )
+
+            last = statistics[-1]
+            self._high_water_marks[statistic_id] = (
+                last["start"].timestamp(),
+                last["sum"],
+            )
+        _LOGGER.debug(
+            "Импортировано %d записей статистики %s", len(statistics), statistic_id
+        )
+
+    async def _async_get_last(self, statistic_id: str) -> tuple[float, float]:
+        """Последний импортированный час и сумма ряда из recorder."""
+        last_stats = await get_instance(self.hass).async_add_executor_job(
+            get_last_statistics, self.hass, 1, statistic_id, True, {"sum"}
+        )
+        if not last_stats.get(statistic_id):
+            return 0.0, 0.0
+        last = last_stats[statistic_id][0]
+        return last["start"], last.get("sum") or 0.0
@@ -0,0 +1,363 @@
+"""Предварительно вычисленные данные лицевых счетов КСК для сенсоров.
+
+Данные счета вычисляются вне event loop (в executor), включая готовые
+атрибуты сенсоров; при записи состояния сенсоры только читают поля.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import datetime
+import logging
+import time
+from typing import Any
+
+from homeassistant.helpers.json import json_bytes
+
+from .const import ATTRIBUTES_SIZE_BUDGET
+from .helpers import _to_float, get_previous_month
+from .history import PaymentHistory
+from .models import DEFAULT_ZONE, Account, Balance, Payment, Reading, Zone, parse_zones
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class AccountView:
+    """Данные лицевого счета, вычисляемые один раз за обновление.
+
+    Сенсоры только читают поля, не перебирая исходные данные API.
+    """
+
+    account: Account = Account("")
+    balance: Balance = Balance()
+
+    # Показания и тарифы по зонам
+    main_reading: float | None = None
+    readings: dict[str, float] = field(default_factory=dict)
+    last_readings: tuple[Reading, ...] = ()
+    zones: dict[str, Zone] = field(default_factory=dict)
+    tariffs: dict[str, float | None] = field(default_factory=dict)
+    default_tariff: float | None = None
+    last_period: str | None = None
+    current_period: str | None = None
+
+    # История платежей
+    latest_payment: Payment | None = None
+    recent_payments: tuple[Payment, ...] = ()
+    payments_count: int = 0
+    payments_accepted: int = 0
+    payments_processing: int = 0
+    payments_accepted_amount: float = 0.0
+    month_period: str | None = None
+    month_total: float = 0.0
+    month_payments: tuple[Payment, ...] = ()
+    # Начало окна истории, хранимого в памяти (см. history_window_start)
+    history_since: str | None = None
+
+    # Готовые атрибуты сенсоров
+    account_attributes: dict[str, Any] = field(default_factory=dict)
+    meter_attributes: dict[str, Any] = field(default_factory=dict)
+    balance_attributes: dict[str, Any] = field(default_factory=dict)
+    zone_attributes: dict[str, dict[str, Any]] = field(default_factory=dict)
+    latest_payment_attributes: dict[str, Any] = field(default_factory=dict)
+    month_attributes: dict[str, Any] = field(default_factory=dict)
+    payment_count_attributes: dict[str, Any] = field(default_factory=dict)
+
+
+def _zone_index(zones: tuple[Zone, ...]) -> dict[str, Zone]:
+    """Индекс зон по названию, при совпадении названий берется первая."""
+    index: dict[str, Zone] = {}
+    for zone in zones:
+        index.setdefault(zone.name, zone)
+    return index
+
+
+def _last_readings(
+    zones: tuple[Zone, ...], last_indications: list[float | None]
+) -> tuple[Reading, ...]:
+    """Последние переданные показания по зонам.
+
+    Значения lastIndications идут в порядке зон из данных передачи
+    показаний; если зон нет, это показание основной зоны.
+    """
+    readings = []
+    for index, zone in enumerate(zones or (Zone(),)):
+        if index < len(last_indications):
+            value = last_indications[index]
+        else:
+            value = zone.indication
+        if value is not None:
+            readings.append(Reading(zone.name, value))
+    return tuple(readings)
+
+
+def limit_attributes(
+    attrs: dict[str, Any], budget: int = ATTRIBUTES_SIZE_BUDGET
+) -> dict[str, Any]:
+    """Ограничение размера атрибутов бюджетом в байтах JSON.
+
+    Если атрибуты не укладываются в бюджет, списки сокращаются с конца,
+    а если и этого мало, списки и словари отбрасываются. Сокращенные
+    атрибуты отмечаются атрибутом truncated.
+    """
+    size = len(json_bytes(attrs))
+    if size <= budget:
+        return attrs
+    _LOGGER.debug("Атрибуты занимают %d байт (бюджет %d), сокращены", size, budget)
+
+    limited = {**attrs, "truncated": True}
+    for key, value in attrs.items():
+        if not isinstance(value, list):
+            continue
+        items = list(value)
+        while items and len(json_bytes(limited)) > budget:
+            items.pop()
+            limited[key] = items
+    if len(json_bytes(limited)) <= budget:
+        return limited
+    return {
+        key: value
+        for key, value in limited.items()
+        if not isinstance(value, (list, dict))
+    }
+
+
+def _fill_attributes(view: AccountView, compact: bool) -> None:
+    """Вычисление готовых атрибутов сенсоров счета."""
+    account = view.account
+    balance = view.balance
+    view.account_attributes = {
+        "address": account.address,
+        "meter_name": account.meter_name,
+        "meter_number": account.meter_number,
+        "zones_count": account.zones_count,
+        "has_invoice": account.has_invoice,
+        "can_sbp": account.can_sbp,
+        "is_before_tech": account.is_before_tech,
+    }
+    view.meter_attributes = {
+        "meter_number": account.meter_number,
+        "zones_count": account.zones_count,
+        "is_before_tech": account.is_before_tech,
+    }
+    view.balance_attributes = {
+        "duty": balance.duty,
+        "sud": balance.sud,
+        "payment_disconnection": balance.payment_disconnection,
+        "penalty": balance.penalty,
+        "accepted": balance.accepted,
+        "processing": balance.processing,
+    }
+
+    for zone_name in (*view.zones, DEFAULT_ZONE):
+        attrs: dict[str, Any] = {
+            "last_period": view.last_period,
+            "current_period": view.current_period,
+            "zone_name": zone_name,
+            "account_number": account.number,
+        }
+        if zone := view.zones.get(zone_name):
+            attrs["tariff"] = zone.tariff
+        view.zone_attributes[zone_name] = attrs
+
+    if (payment := view.latest_payment) is not None:
+        attrs = {
+            "date": payment.day,  # Только дата без времени
+            "period": payment.period,
+            "bank": payment.bank,
+            "status": "Зачисленный" if payment.accepted else "Обработка",
+            "amount": payment.amount,
+            "total_payments": view.payments_count,
+            "history_since": view.history_since,
+        }
+        if not compact:
+            # Первые 5 платежей
+            attrs["raw_history"] = [item.as_api() for item in view.recent_payments]
+        view.latest_payment_attributes = limit_attributes(attrs)
+
+    attrs = {"count": len(view.month_payments), "period": view.month_period}
+    if not compact:
+        attrs["month_payments"] = [
+            {"date": item.day, "amount": item.amount, "bank": item.bank}
+            for item in view.month_payments
+        ]
+    view.month_attributes = limit_attributes(attrs)
+
+    view.payment_count_attributes = {
+        "successful": view.payments_accepted,
+        "processing": view.payments_processing,
+        "total_amount": view.payments_accepted_amount,
+    }
+
+
+def build_account_view(
+    account: Account, details: dict[str, Any], now: datetime, compact: bool = False
+) -> AccountView:
+    """Вычисление данных лицевого счета для сенсоров.
+
+    Функция не обращается к event loop и выполняется в executor;
+    compact - настройка компактных атрибутов.
+    """
+    transmission = details.get("transmission_details") or {}
+    payment_history: PaymentHistory = details.get("payment_history") or PaymentHistory()
+
+    view = AccountView(
+        account=account,
+        balance=account.balance,
+        last_period=transmission.get("lastPeriod"),
+        current_period=transmission.get("period"),
+        default_tariff=account.tariffs[0] if account.tariffs else None,
+        month_period=now.strftime("%m-%Y"),
+        payments_count=payment_history.total_count,
+        payments_accepted=payment_history.accepted_count,
+        payments_processing=payment_history.total_count - payment_history.accepted_count,
+        payments_accepted_amount=payment_history.accepted_amount,
+        history_since=get_previous_month().isoformat(),
+    )
+
+    # Показания: основная зона - первое значение lastIndications,
+    # зоны из transmission данных актуальнее зон из данных счета
+    last_indications = [
+        _to_float(value) for value in transmission.get("lastIndications") or []
+    ]
+    if last_indications:
+        view.main_reading = last_indications[0]
+
+    zones = parse_zones(transmission.get("zones"))
+    view.last_readings = _last_readings(zones, last_indications)
+    transmission_zones = _zone_index(zones)
+    account_zones = _zone_index(account.zones)
+    view.zones = {**account_zones, **transmission_zones}
+    for zone_index in (account_zones, transmission_zones):
+        for name, zone in zone_index.items():
+            if zone.indication is not None:
+                view.readings[name] = zone.indication
+    view.tariffs = {name: zone.tariff for name, zone in account_zones.items()}
+
+    # Платежи: итоги по всей истории посчитаны при разборе ответа API,
+    # последний платеж и платежи за месяц берутся из окна истории
+    if (latest := payment_history.latest_index()) is not None:
+        view.latest_payment = payment_history.payment(latest)
+
+    month_payments = []
+    for index, period in enumerate(payment_history.periods):
+        if period != view.month_period or not payment_history.accepted(index):
+            continue
+        payment = payment_history.payment(index)
+        if payment.amount is not None:
+            view.month_total += payment.amount
+        month_payments.append(payment)
+    view.month_payments = tuple(month_payments)
+
+    view.recent_payments = tuple(
+        payment_history.payment(index) for index in range(min(5, len(payment_history)))
+    )
+    _fill_attributes(view, compact)
+    return view
+
+
+def build_account_view_timed(
+    account: Account, details: dict[str, Any], now: datetime, compact: bool = False
+) -> tuple[AccountView, float]:
+    """Вычисление данных лицевого счета и его длительность, с."""
+    started = time.perf_counter()
+    view = build_account_view(account, details, now, compact)
+    return view, time.perf_counter() - started
+
+
+# Поля баланса, суммируемые по всем счетам
+PORTFOLIO_FIELDS = ("debt", "penalty", "accepted", "processing")
+
+
+@dataclass(slots=True)
+class PortfolioTotals:
+    """Итоги по группе лицевых счетов."""
+
+    accounts: int = 0
+    in_arrears: int = 0
+    sums: dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(PORTFOLIO_FIELDS, 0.0)
+    )
+
+    def apply(self, contribution: tuple[float, ...], sign: int) -> None:
+        """Добавление (sign=1) или вычитание (sign=-1) вклада счета."""
+        *amounts, in_arrears = contribution
+        self.accounts += sign
+        self.in_arrears += sign * int(in_arrears)
+        for key, amount in zip(PORTFOLIO_FIELDS, amounts):
+            self.sums[key] += sign * amount
+
+    def get(self, key: str) -> float | int:
+        """Итог по полю баланса или количеству счетов с задолженностью."""
+        if key == "in_arrears":
+            return self.in_arrears
+        # Суммы накапливаются приращениями, округляем погрешность float
+        return round(self.sums[key], 2)
+
+
+def account_district(account: Account, default: int | None) -> str:
+    """Район лицевого счета.
+
+    Номер счета с префиксом района - район, умноженный на 1e8, плюс номер
+    (см. AuthVariant.payload); для остальных счетов берется район, с которым
+    прошла авторизация.
+    """
+    number = str(account.number)
+    if number.isdigit() and int(number) >= int(1e8):
+        return str(int(number) // int(1e8))
+    return str(default) if default is not None else "unknown"
+
+
+class PortfolioAggregator:
+    """Итоги балансов по всем счетам и по районам.
+
+    Итоги не пересчитываются по всем счетам: при изменении счета
+    вычитается его прежний вклад и добавляется новый.
+    """
+
+    def __init__(self, default_district: int | None = None) -> None:
+        """Инициализация итогов."""
+        self.default_district = default_district
+        self.totals = PortfolioTotals()
+        self.districts: dict[str, PortfolioTotals] = {}
+        self._contributions: dict[str, tuple[str, tuple[float, ...]]] = {}
+
+    def set_default_district(
+        self, district: int | None, accounts: Iterable[Account]
+    ) -> bool:
+        """Смена района, с которым прошла авторизация.
+
+        Вклады счетов пересчитываются; возвращает True, если район изменился.
+        """
+        if district == self.default_district:
+            return False
+        self.default_district = district
+        for account in accounts:
+            self.update(account)
+        return True
+
+    def update(self, account: Account) -> None:
+        """Учет нового или изменившегося счета."""
+        account_id = account.number
+        amounts = tuple(getattr(account.balance, key) for key in PORTFOLIO_FIELDS)
+        contribution = (*amounts, float(amounts[0] > 0))
+        district = account_district(account, self.default_district)
+
+        if self._contributions.get(account_id) == (district, contribution):
+            return
+        self.remove(account_id)
+        self._contributions[account_id] = (district, contribution)
+        self.totals.apply(contribution, 1)
+        self.districts.setdefault(district, PortfolioTotals()).apply(contribution, 1)
+
+    def remove(self, account_id: str) -> None:
+        """Исключение счета из итогов."""
+        if (previous := self._contributions.pop(account_id, None)) is None:
+            return
+        district, contribution = previous
+        self.totals.apply(contribution, -1)
+        totals = self.districts[district]
+        totals.apply(contribution, -1)
+        if not totals.accounts:
+            del self.districts[district]